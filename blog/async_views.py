@@ -0,0 +1,365 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from django.views import View
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
+
+import json
+from json.decoder import JSONDecodeError
+
+from blog.caching import acache_article, acache_comment_list, aget_cached_article, aget_cached_comment_list, aget_version
+from blog.changes import comment_sources, decode_cursor, encode_cursor, get_changes
+from blog.events import CLOSE, comment_topic, get_broker
+from blog.handlers import AsyncStreamingHttpResponse
+from blog.models import Article, Comment
+from blog.routers import reads_from_primary
+from blog.views import (
+    RequestBodyTooLarge, change_op, check_user_auth, create_comment, delete_article, delete_comment,
+    embedded_comments_querysets, etag_matches, format_etag, get_body_value, get_flag_param, get_id_list_param,
+    get_include_comments, get_int_param, is_author, not_modified, serialize_article, serialize_article_detail,
+    serialize_change, serialize_comment, serialize_with_comments, set_etag, stream_json_list, update_comment,
+    with_comments_cutoff,
+)
+from blog.writer import run_write
+
+# Async counterparts of the blog views, routed by myblog.async_urls. Responses
+# match blog.views exactly. Cache calls use the async cache API, so a network
+# backend behind the 'blog' alias does not block the event loop.
+
+async def acheck_user_auth(request):
+    # Loads the session and user (both sync) in one hop.
+    return await sync_to_async(check_user_auth)(request)
+
+async def amake_etag(request, name, *extra):
+    versions = [await aget_version(x) for x in (name, *extra)]
+    return versions[0], format_etag(request, name, versions)
+
+async def aget_article(id):
+    try:
+        return await Article.objects.aget(id=id)
+    except Article.DoesNotExist:
+        return None
+
+async def aarticle_exists(id):
+    return await Article.objects.filter(id=id).aexists()
+
+async def aget_comment(id):
+    try:
+        return await Comment.objects.aget(id=id)
+    except Comment.DoesNotExist:
+        return None
+
+async def acreate(model, **kwargs):
+    if settings.BLOG_WRITE_QUEUE:
+        return await sync_to_async(run_write)(model.objects.create, **kwargs)
+    return await model.objects.acreate(**kwargs)
+
+async def arun_write(func, *args, **kwargs):
+    return await sync_to_async(run_write)(func, *args, **kwargs)
+
+async def apaginate(queryset, after, limit):
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+    page = [obj async for obj in queryset.order_by('id')[:limit + 1]]
+    next_cursor = page[limit - 1].id if len(page) > limit else None
+    return page[:limit], next_cursor
+
+async def aserialize_articles(articles, comments_limit):
+    if comments_limit is None or not articles:
+        return list(map(serialize_article, articles))
+    comments = [comment for queryset in embedded_comments_querysets(articles) async for comment in queryset]
+    return serialize_with_comments(articles, comments)
+
+
+class ArticleCreateListView(View):
+
+    async def get(self, request):
+        if not await acheck_user_auth(request): return HttpResponse(status=401)
+        try:
+            after = get_int_param(request, 'after')
+            limit = get_int_param(request, 'limit', minimum=1)
+            ids = get_id_list_param(request, 'ids', settings.BLOG_BATCH_MAX_IDS)
+            comments_limit = get_include_comments(request)
+        except ValueError:
+            return HttpResponseBadRequest()
+        stream = get_flag_param(request, 'stream')
+        if stream and comments_limit is not None:
+            return HttpResponseBadRequest()
+        if comments_limit is None:
+            _, etag = await amake_etag(request, "articles")
+            articles = Article.objects.all()
+        else:
+            _, etag = await amake_etag(request, "articles", "comments")
+            articles = with_comments_cutoff(Article.objects.all(), comments_limit)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        if ids is not None:
+            found = await articles.ain_bulk(ids)
+            serialized = {article['id']: article for article in await aserialize_articles(list(found.values()), comments_limit)}
+            articles = [serialized.get(id, {"id": id, "missing": True}) for id in ids]
+            response = JsonResponse(articles, status=200, safe=False)
+        elif stream:
+            if after is not None:
+                articles = articles.filter(id__gt=after)
+            response = stream_json_list(articles.order_by('id'), serialize_article)
+        elif after is None and limit is None:
+            articles, next_cursor = await apaginate(articles, None, settings.BLOG_UNPAGINATED_MAX)
+            articles = await aserialize_articles(articles, comments_limit)
+            response = JsonResponse(articles, status=200, safe=False)
+            if next_cursor is not None:
+                response['X-Next-Cursor'] = next_cursor
+        else:
+            limit = min(limit or settings.BLOG_PAGE_SIZE, settings.BLOG_MAX_PAGE_SIZE)
+            articles, next_cursor = await apaginate(articles, after, limit)
+            articles = await aserialize_articles(articles, comments_limit)
+            response = JsonResponse({"results": articles, "next": next_cursor}, status=200)
+        set_etag(response, etag)
+        return response
+
+    async def post(self, request):
+        if not await acheck_user_auth(request): return HttpResponse(status=401)
+        author = request.user
+        try:
+            title, content = get_body_value(request, 'title', 'content')
+        except RequestBodyTooLarge:
+            return HttpResponse(status=413)
+        except (KeyError, JSONDecodeError):
+            return HttpResponseBadRequest()
+        article = await acreate(Article, title=title, content=content, author=author)
+        return JsonResponse(serialize_article(article), status=201)
+
+
+class ArticleRetUptDelView(View):
+
+    async def get(self, request, id):
+        if not await acheck_user_auth(request): return HttpResponse(status=401)
+        try:
+            comments_limit = get_include_comments(request)
+        except ValueError:
+            return HttpResponseBadRequest()
+        if comments_limit is not None:
+            return await self.get_with_comments(request, id, comments_limit)
+        _, etag = await amake_etag(request, f"article:{id}")
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        content = await aget_cached_article(id)
+        if content is not None:
+            response = HttpResponse(content, status=200, content_type='application/json')
+        else:
+            article = await aget_article(id)
+            if not article:
+                return HttpResponse(status=404)
+            response = JsonResponse(serialize_article_detail(article), status=200)
+            if reads_from_primary():
+                await acache_article(id, response.content)
+        set_etag(response, etag)
+        return response
+
+    async def get_with_comments(self, request, id, comments_limit):
+        _, etag = await amake_etag(request, f"article:{id}", f"comments:{id}")
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        article = await with_comments_cutoff(Article.objects.filter(id=id), comments_limit).afirst()
+        if not article:
+            return HttpResponse(status=404)
+        comments = [comment for queryset in embedded_comments_querysets([article]) async for comment in queryset]
+        article = serialize_with_comments([article], comments, serialize_article_detail)[0]
+        response = JsonResponse(article, status=200)
+        set_etag(response, etag)
+        return response
+
+    async def put(self, request, id):
+        if not await acheck_user_auth(request): return HttpResponse(status=401)
+        article = await aget_article(id)
+        if not article:
+            return HttpResponse(status=404)
+        if not is_author(article, request):
+            return HttpResponse(status=403)
+        try:
+            title, content = get_body_value(request, 'title', 'content')
+        except RequestBodyTooLarge:
+            return HttpResponse(status=413)
+        except (KeyError, JSONDecodeError):
+            return HttpResponseBadRequest()
+        article.title = title
+        article.content = content
+        await arun_write(article.save, update_fields=['title', 'content', 'updated_at'])
+        return JsonResponse(serialize_article(article), status=200)
+
+    async def delete(self, request, id):
+        if not await acheck_user_auth(request): return HttpResponse(status=401)
+        article = await aget_article(id)
+        if not article:
+            return HttpResponse(status=404)
+        if not is_author(article, request):
+            return HttpResponse(status=403)
+        await arun_write(delete_article, article)
+        return HttpResponse(status=200)
+
+
+class CommentCreateListView(View):
+
+    async def get(self, request, id):
+        if not await acheck_user_auth(request): return HttpResponse(status=401)
+        try:
+            after = get_int_param(request, 'after')
+            limit = get_int_param(request, 'limit', minimum=1)
+        except ValueError:
+            return HttpResponseBadRequest()
+        version, etag = await amake_etag(request, f"comments:{id}")
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        stream = get_flag_param(request, 'stream')
+        paginated = not stream and (after is not None or limit is not None)
+        if not stream and not paginated:
+            content = await aget_cached_comment_list(id, version)
+            if content is not None:
+                response = HttpResponse(content, status=200, content_type='application/json')
+                set_etag(response, etag)
+                return response
+        comments = Comment.objects.filter(article=id)
+        if stream:
+            if not await aarticle_exists(id):
+                return HttpResponse(status=404)
+            if after is not None:
+                comments = comments.filter(id__gt=after)
+            response = stream_json_list(comments.order_by('id'), serialize_comment)
+        elif paginated:
+            limit = min(limit or settings.BLOG_PAGE_SIZE, settings.BLOG_MAX_PAGE_SIZE)
+            comments, next_cursor = await apaginate(comments, after, limit)
+            if not comments and not await aarticle_exists(id):
+                return HttpResponse(status=404)
+            comments = list(map(serialize_comment, comments))
+            response = JsonResponse({"results": comments, "next": next_cursor}, status=200)
+        else:
+            comments = [serialize_comment(comment) async for comment in comments.order_by('id')]
+            if not comments and not await aarticle_exists(id):
+                return HttpResponse(status=404)
+            response = JsonResponse(comments, status=200, safe=False)
+            if reads_from_primary():
+                await acache_comment_list(id, version, response.content)
+        set_etag(response, etag)
+        return response
+
+    async def post(self, request, id):
+        if not await acheck_user_auth(request): return HttpResponse(status=401)
+        article = await aget_article(id)
+        if not article:
+            return HttpResponse(status=404)
+        author = request.user
+        try:
+            content = get_body_value(request, 'content')[0]
+        except RequestBodyTooLarge:
+            return HttpResponse(status=413)
+        except (KeyError, JSONDecodeError):
+            return HttpResponseBadRequest()
+        comment = await arun_write(create_comment, content=content, article=article, author=author)
+        return JsonResponse(serialize_comment(comment), status=201)
+
+
+class CommentRetUptDelView(View):
+
+    async def get(self, request, id):
+        if not await acheck_user_auth(request): return HttpResponse(status=401)
+        _, etag = await amake_etag(request, f"comment:{id}")
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        comment = await aget_comment(id)
+        if not comment:
+            return HttpResponse(status=404)
+        response = JsonResponse({
+            "content": comment.content,
+            "article": comment.article_id,
+            "author": comment.author_id}, status=200)
+        set_etag(response, etag)
+        return response
+
+    async def put(self, request, id):
+        if not await acheck_user_auth(request): return HttpResponse(status=401)
+        comment = await aget_comment(id)
+        if not comment:
+            return HttpResponse(status=404)
+        if not is_author(comment, request):
+            return HttpResponse(status=403)
+        try:
+            content = get_body_value(request, 'content')[0]
+        except RequestBodyTooLarge:
+            return HttpResponse(status=413)
+        except (KeyError, JSONDecodeError):
+            return HttpResponseBadRequest()
+        comment.content = content
+        await arun_write(update_comment, comment)
+        return JsonResponse(serialize_comment(comment), status=200)
+
+    async def delete(self, request, id):
+        if not await acheck_user_auth(request): return HttpResponse(status=401)
+        comment = await aget_comment(id)
+        if not comment:
+            return HttpResponse(status=404)
+        if not is_author(comment, request):
+            return HttpResponse(status=403)
+        await arun_write(delete_comment, comment)
+        return HttpResponse(status=200)
+
+
+def format_event(cursor, change):
+    return f"id: {encode_cursor(*cursor)}\ndata: {json.dumps(change, cls=DjangoJSONEncoder)}\n\n"
+
+async def comment_events(article_id, since, subscription):
+    topic = comment_topic(article_id)
+    try:
+        yield f"retry: {settings.BLOG_EVENT_RETRY_MS}\n\n"
+        # Subscribed before replaying, so nothing committed in between is
+        # lost; events the replay already sent are skipped.
+        replayed = set()
+        until = timezone.now()
+        cursor = since
+        while cursor is not None:
+            rows, more = await sync_to_async(get_changes)(
+                cursor, until, settings.BLOG_PAGE_SIZE, comment_sources(article_id))
+            for timestamp, source, obj in rows:
+                cursor = (timestamp, source, obj.id)
+                replayed.add(cursor)
+                yield format_event(cursor, serialize_change(obj, change_op(obj, since)))
+            if not more:
+                cursor = None
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), settings.BLOG_EVENT_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if event is CLOSE:
+                return
+            cursor, change = event
+            if cursor not in replayed:
+                yield format_event(cursor, change)
+            if subscription.overflowed and subscription.queue.empty():
+                # Events were dropped; the client reconnects with the last id
+                # it saw and replays the rest.
+                return
+    finally:
+        get_broker().unsubscribe(topic, subscription)
+
+
+class CommentStreamView(View):
+
+    async def get(self, request, id):
+        if not await acheck_user_auth(request): return HttpResponse(status=401)
+        last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+        try:
+            since = decode_cursor(last_event_id) if last_event_id else None
+        except ValueError:
+            return HttpResponseBadRequest()
+        subscription = get_broker().subscribe(comment_topic(id))
+        if not await aarticle_exists(id):
+            get_broker().unsubscribe(comment_topic(id), subscription)
+            return HttpResponse(status=404)
+        response = AsyncStreamingHttpResponse(comment_events(id, since, subscription), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
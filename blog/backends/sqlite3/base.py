@@ -0,0 +1,25 @@
+from contextlib import contextmanager
+
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # Django 4.1 opens atomic() blocks with a deferred BEGIN. A transaction
+    # that reads before it writes then has to upgrade its lock, and under WAL
+    # that fails with "database is locked" at once, without waiting out
+    # busy_timeout, if another writer committed in between. BEGIN IMMEDIATE
+    # takes the write lock up front, where busy_timeout applies.
+    begin_immediate = True
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute("BEGIN IMMEDIATE" if self.begin_immediate else "BEGIN")
+
+    @contextmanager
+    def deferred_transactions(self):
+        # For read-only transactions, which would otherwise keep every writer
+        # waiting until they end.
+        self.begin_immediate = False
+        try:
+            yield
+        finally:
+            self.begin_immediate = True
@@ -0,0 +1,171 @@
+import asyncio
+import statistics
+import sys
+import threading
+import time
+from io import BytesIO
+
+from django.db import connections
+
+
+def asgi_scope(method, path, query_string="", headers=()):
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"localhost"), *headers],
+        "client": ("127.0.0.1", 1234),
+        "server": ("localhost", 80),
+    }
+
+async def asgi_request(application, method, path, query_string="", headers=(), body=b""):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(asgi_scope(method, path, query_string, headers), receive, send)
+    return messages
+
+def response_status(messages):
+    return messages[0]["status"]
+
+def response_body(messages):
+    return b"".join(message.get("body", b"") for message in messages[1:])
+
+def wsgi_environ(method, path, query_string="", headers=(), body=b""):
+    environ = {
+        "REQUEST_METHOD": method,
+        "SCRIPT_NAME": "",
+        "PATH_INFO": path,
+        "QUERY_STRING": query_string,
+        "CONTENT_LENGTH": str(len(body)),
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "REMOTE_ADDR": "127.0.0.1",
+        "HTTP_HOST": "localhost",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": "http",
+        "wsgi.input": BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in headers:
+        name = name.decode("ascii").upper().replace("-", "_")
+        if name != "CONTENT_TYPE":
+            name = f"HTTP_{name}"
+        environ[name] = value.decode("latin1")
+    return environ
+
+def wsgi_request(application, method, path, query_string="", headers=(), body=b""):
+    # Returns (status code, body).
+    started = []
+
+    def start_response(status, response_headers, exc_info=None):
+        started.append(int(status.split()[0]))
+
+    response = application(wsgi_environ(method, path, query_string, headers, body), start_response)
+    try:
+        content = b"".join(response)
+    finally:
+        response.close()
+    return started[0], content
+
+async def run_asgi_load(application, requests, concurrency):
+    # requests: list of (method, path, query_string, headers, body) tuples,
+    # shared by `concurrency` workers that each issue the next one as soon as
+    # they finish.
+    pending = iter(requests)
+    latencies = []
+    statuses = {}
+
+    async def worker():
+        for method, path, query_string, headers, body in pending:
+            start = time.perf_counter()
+            messages = await asgi_request(application, method, path, query_string, headers, body)
+            latencies.append(time.perf_counter() - start)
+            status = response_status(messages)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, statuses, time.perf_counter() - start
+
+def run_wsgi_load(application, requests, concurrency):
+    # Same as run_asgi_load with one thread, and so one database connection,
+    # per worker, as under a threaded WSGI server.
+    pending = iter(requests)
+    lock = threading.Lock()
+    latencies = []
+    statuses = {}
+
+    def worker():
+        try:
+            while True:
+                with lock:
+                    request = next(pending, None)
+                if request is None:
+                    return
+                start = time.perf_counter()
+                status, _ = wsgi_request(application, *request)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, time.perf_counter() - start
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+def compare(report, baseline):
+    # Relative change of each route present in both reports, per target.
+    changes = {}
+    for target, routes in report["targets"].items():
+        for route, result in routes.items():
+            before = baseline.get("targets", {}).get(target, {}).get(route)
+            if before is None:
+                continue
+            changes.setdefault(target, {})[route] = {
+                "p50_change": relative_change(before["p50_ms"], result["p50_ms"]),
+                "p95_change": relative_change(before["p95_ms"], result["p95_ms"]),
+                "p99_change": relative_change(before["p99_ms"], result["p99_ms"]),
+                "rps_change": relative_change(before["rps"], result["rps"]),
+                "queries_per_request": [before.get("queries_per_request"), result.get("queries_per_request")],
+            }
+    return changes
+
+def relative_change(before, after):
+    return round((after - before) / before, 3) if before else 0.0
@@ -0,0 +1,81 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+def get_cache():
+    return caches[settings.BLOG_CACHE_ALIAS]
+
+def invalidate(func, *args):
+    # Run now and again after commit, so a concurrent reader cannot re-cache
+    # the pre-write rows in between.
+    func(*args)
+    transaction.on_commit(lambda: func(*args))
+
+def version_key(name):
+    return f"blog:version:{name}"
+
+def get_version(name):
+    cache = get_cache()
+    version = cache.get(version_key(name))
+    if version is None:
+        # Seed from the clock so a counter lost to eviction restarts above
+        # every value it previously handed out.
+        cache.add(version_key(name), time.time_ns(), settings.BLOG_VERSION_TIMEOUT)
+        version = cache.get(version_key(name))
+    return version
+
+async def aget_version(name):
+    cache = get_cache()
+    version = await cache.aget(version_key(name))
+    if version is None:
+        await cache.aadd(version_key(name), time.time_ns(), settings.BLOG_VERSION_TIMEOUT)
+        version = await cache.aget(version_key(name))
+    return version
+
+def bump_version(name):
+    cache = get_cache()
+    try:
+        cache.incr(version_key(name))
+    except ValueError:
+        cache.set(version_key(name), time.time_ns(), settings.BLOG_VERSION_TIMEOUT)
+
+def article_key(id):
+    return f"blog:article:{id}"
+
+def get_cached_article(id):
+    return get_cache().get(article_key(id))
+
+def cache_article(id, content):
+    get_cache().set(article_key(id), content, settings.BLOG_ARTICLE_CACHE_TIMEOUT)
+
+async def aget_cached_article(id):
+    return await get_cache().aget(article_key(id))
+
+async def acache_article(id, content):
+    await get_cache().aset(article_key(id), content, settings.BLOG_ARTICLE_CACHE_TIMEOUT)
+
+def invalidate_article(id):
+    get_cache().delete(article_key(id))
+
+def comment_list_key(article_id, version):
+    return f"blog:comments:{article_id}:{version}"
+
+def get_cached_comment_list(article_id, version):
+    return get_cache().get(comment_list_key(article_id, version))
+
+def cache_comment_list(article_id, version, content):
+    get_cache().set(comment_list_key(article_id, version), content, settings.BLOG_COMMENT_LIST_CACHE_TIMEOUT)
+
+async def aget_cached_comment_list(article_id, version):
+    return await get_cache().aget(comment_list_key(article_id, version))
+
+async def acache_comment_list(article_id, version, content):
+    await get_cache().aset(comment_list_key(article_id, version), content, settings.BLOG_COMMENT_LIST_CACHE_TIMEOUT)
+
+def invalidate_comment_list(article_id):
+    bump_version(f"comments:{article_id}")
+    # Article lists with embedded comments cover every article.
+    bump_version("comments")
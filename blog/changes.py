@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+
+from blog.models import Article, Comment, Tombstone
+
+# The change feed merges rows updated or deleted after a cursor. A cursor is
+# "<microseconds since epoch>.<source>.<id>" for the last change a client has
+# seen; the source index breaks ties between rows with the same timestamp.
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+SOURCES = [
+    (Article, 'updated_at'),
+    (Comment, 'updated_at'),
+    (Tombstone, 'deleted_at'),
+]
+ARTICLE_SOURCE, COMMENT_SOURCE, TOMBSTONE_SOURCE = range(len(SOURCES))
+
+
+def encode_cursor(timestamp, source, id):
+    return f"{(timestamp - EPOCH) // timedelta(microseconds=1)}.{source}.{id}"
+
+def decode_cursor(cursor):
+    micros, source, id = (int(x) for x in cursor.split('.'))
+    if not 0 <= source < len(SOURCES):
+        raise ValueError(f"unknown source {source}")
+    if not -2 ** 63 <= id < 2 ** 63:
+        raise ValueError(f"id out of range {id}")
+    try:
+        return EPOCH + timedelta(microseconds=micros), source, id
+    except OverflowError:
+        raise ValueError(f"timestamp out of range {micros}")
+
+def change_cursor(source, obj):
+    return getattr(obj, SOURCES[source][1]), source, obj.id
+
+def all_sources():
+    return [(source, model.objects.all()) for source, (model, field) in enumerate(SOURCES)]
+
+def comment_sources(article_id):
+    return [
+        (COMMENT_SOURCE, Comment.objects.filter(article=article_id)),
+        (TOMBSTONE_SOURCE, Tombstone.objects.filter(article_id=article_id, kind=Tombstone.COMMENT)),
+    ]
+
+def get_changes(since, until, limit, sources=None):
+    # Returns up to limit (timestamp, source, obj) rows after the cursor, in
+    # cursor order, and whether more follow. Each source is one range scan on
+    # its (timestamp, id) index.
+    rows = []
+    for source, queryset in sources or all_sources():
+        field = SOURCES[source][1]
+        queryset = queryset.filter(**{f"{field}__lte": until})
+        if since is not None:
+            timestamp, since_source, since_id = since
+            queryset = queryset.filter(**{f"{field}__gte": timestamp})
+            if source < since_source:
+                queryset = queryset.exclude(**{field: timestamp})
+            elif source == since_source:
+                queryset = queryset.exclude(**{field: timestamp, 'id__lte': since_id})
+        for obj in queryset.order_by(field, 'id')[:limit + 1]:
+            rows.append((getattr(obj, field), source, obj))
+    rows.sort(key=lambda row: (row[0], row[1], row[2].id))
+    return rows[:limit], len(rows) > limit
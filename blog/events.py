@@ -0,0 +1,71 @@
+import asyncio
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+# In-process pub/sub for live comment changes. Write paths publish after commit
+# from whatever thread ran the write; each subscriber is an asyncio queue read
+# by one event stream on the loop that subscribed. A process only sees its own
+# writes, so clients resume through Last-Event-ID replay from the database.
+
+CLOSE = None
+
+
+class Subscription:
+
+    def __init__(self, loop, max_size):
+        self.loop = loop
+        self.queue = asyncio.Queue(max_size)
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # The stream ends once drained and the client resumes from the
+            # database.
+            self.overflowed = True
+
+
+class Broker:
+
+    def __init__(self):
+        self.subscriptions = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, topic):
+        subscription = Subscription(asyncio.get_running_loop(), settings.BLOG_EVENT_QUEUE_SIZE)
+        with self.lock:
+            self.subscriptions.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, topic, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(topic, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self.subscriptions.pop(topic, None)
+
+    def publish(self, topic, event):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(topic, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # The loop closed under a subscriber that never unsubscribed.
+                self.unsubscribe(topic, subscription)
+
+
+_broker = Broker()
+
+def get_broker():
+    return _broker
+
+def comment_topic(article_id):
+    return f"comments:{article_id}"
+
+def publish(topic, event):
+    # Subscribers must never see a write that rolls back.
+    transaction.on_commit(lambda: get_broker().publish(topic, event))
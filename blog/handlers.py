@@ -0,0 +1,130 @@
+import asyncio
+from contextlib import suppress
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.http.response import HttpResponseBase
+
+_done = object()
+
+
+class AsyncStreamingHttpResponse(HttpResponseBase):
+    # Django 4.1 cannot stream from an async iterator; BlogASGIHandler sends
+    # these itself and stops iterating when the client disconnects.
+    streaming = True
+
+    def __init__(self, streaming_content, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.async_streaming_content = streaming_content
+
+
+class ResponseChannel:
+    # The ASGI send callable, carrying receive along so send_response can
+    # watch for http.disconnect.
+
+    def __init__(self, send, receive):
+        self.send = send
+        self.receive = receive
+
+    async def __call__(self, message):
+        await self.send(message)
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+class BlogASGIHandler(ASGIHandler):
+    # Django 4.1 iterates streaming responses on the event loop, so a body
+    # generated from a QuerySet iterator raises SynchronousOnlyOperation.
+    # Pull each part on the thread the sync views use instead.
+    #
+    # urlconf overrides ROOT_URLCONF for the requests this handler serves, so
+    # one settings module can route WSGI and ASGI to different views.
+
+    def __init__(self, urlconf=None):
+        super().__init__()
+        self.urlconf = urlconf
+
+    async def get_response_async(self, request):
+        if self.urlconf is not None:
+            request.urlconf = self.urlconf
+        return await super().get_response_async(request)
+
+    async def handle(self, scope, receive, send):
+        await super().handle(scope, receive, ResponseChannel(send, receive))
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        response_headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode("ascii")
+            if isinstance(value, str):
+                value = value.encode("latin1")
+            response_headers.append((bytes(header), bytes(value)))
+        for c in response.cookies.values():
+            response_headers.append(
+                (b"Set-Cookie", c.output(header="").encode("ascii").strip())
+            )
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": response_headers,
+            }
+        )
+        if isinstance(response, AsyncStreamingHttpResponse):
+            connected = await self.send_async_parts(response, send)
+        else:
+            connected = await self.send_parts(response, send)
+        if connected:
+            await send({"type": "http.response.body"})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+    async def send_parts(self, response, send):
+        parts = iter(response)
+        next_part = sync_to_async(next, thread_sensitive=True)
+        while (part := await next_part(parts, _done)) is not _done:
+            await self.send_part(part, send)
+        return True
+
+    async def send_async_parts(self, response, send):
+        receive = getattr(send, "receive", None)
+        if receive is not None:
+            disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+        else:
+            disconnected = asyncio.get_running_loop().create_future()
+        parts = response.async_streaming_content.__aiter__()
+        try:
+            while True:
+                next_part = asyncio.ensure_future(parts.__anext__())
+                await asyncio.wait({next_part, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if not next_part.done():
+                    next_part.cancel()
+                    with suppress(asyncio.CancelledError, StopAsyncIteration):
+                        await next_part
+                    return False
+                try:
+                    part = next_part.result()
+                except StopAsyncIteration:
+                    return True
+                await self.send_part(part, send)
+        finally:
+            disconnected.cancel()
+            if hasattr(parts, "aclose"):
+                await parts.aclose()
+
+    async def send_part(self, part, send):
+        if isinstance(part, str):
+            part = part.encode()
+        for chunk, _ in self.chunk_bytes(part):
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": True,
+                }
+            )
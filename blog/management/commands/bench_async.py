@@ -0,0 +1,66 @@
+import json
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+
+from blog.bench import run_asgi_load, summarize
+from blog.handlers import BlogASGIHandler
+from blog.models import Article, Comment
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests per second of the sync views (myblog.urls) and the async views "
+        "(myblog.async_urls) under the ASGI handler. Runs against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--articles', type=int, default=1000)
+        parser.add_argument('--comments', type=int, default=100)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=32)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0)
+        try:
+            report = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run(self, options):
+        user = User.objects.create_user(username='bench', password='bench')
+        articles = Article.objects.bulk_create([
+            Article(title=f"title..{i}", content=f"content..{i}", author=user)
+            for i in range(options['articles'])
+        ])
+        article = articles[0]
+        Comment.objects.bulk_create([
+            Comment(content=f"content..{i}", article=article, author=user)
+            for i in range(options['comments'])
+        ])
+        client = Client()
+        client.force_login(user)
+        headers = ((b"cookie", f"sessionid={client.cookies['sessionid'].value}".encode()),)
+        routes = [
+            ('GET', '/api/article/', 'limit=20', headers, b""),
+            ('GET', f'/api/article/{article.id}/', '', headers, b""),
+            ('GET', f'/api/article/{article.id}/comment/', '', headers, b""),
+        ]
+        requests = [routes[i % len(routes)] for i in range(options['requests'])]
+
+        report = {"options": {key: options[key] for key in ('articles', 'comments', 'requests', 'concurrency')}}
+        application = BlogASGIHandler()
+        for name, urlconf in [('sync', 'myblog.urls'), ('async', 'myblog.async_urls')]:
+            with override_settings(ROOT_URLCONF=urlconf):
+                for cache in caches.all():
+                    cache.clear()
+                latencies, statuses, elapsed = async_to_sync(run_asgi_load)(
+                    application, requests, options['concurrency'])
+            report[name] = dict(summarize(latencies, elapsed), statuses=statuses)
+        return report
@@ -0,0 +1,201 @@
+import json
+import os
+import random
+import tempfile
+from itertools import count
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Min
+from django.test import Client, override_settings
+
+from blog.bench import compare, run_asgi_load, run_wsgi_load, summarize
+from blog.handlers import BlogASGIHandler
+from blog.metrics import get_metrics
+from blog.models import Article, Comment
+from blog.seed import WORDS, seed_articles
+
+TARGETS = {
+    'wsgi': ('myblog.urls', WSGIHandler, run_wsgi_load),
+    'asgi': ('myblog.urls', BlogASGIHandler, async_to_sync(run_asgi_load)),
+    'asgi-async': ('myblog.async_urls', BlogASGIHandler, async_to_sync(run_asgi_load)),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a fresh throwaway test database per target and drive every route of blog.urls through the "
+        "WSGI or ASGI handler with concurrent clients. Prints p50/p95/p99 latency, requests per second "
+        "and queries per request as JSON, optionally compared against a saved baseline report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--articles', type=int, default=1000)
+        parser.add_argument('--comments', type=int, default=10000,
+                            help="Total comments, spread over the articles with a Zipf distribution.")
+        parser.add_argument('--skew', type=float, default=1.0, help="Zipf exponent of comments per article.")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per route and target.")
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--targets', nargs='+', choices=list(TARGETS), default=list(TARGETS))
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write the report here instead of stdout.")
+        parser.add_argument('--baseline', help="A previous report to compare against.")
+        parser.add_argument('--max-regression', type=float,
+                            help="Fail if any p95 latency grew by more than this fraction of the baseline.")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+        elif options['max_regression'] is not None:
+            raise CommandError("--max-regression needs --baseline")
+
+        old_name = connection.settings_dict['NAME']
+        if connection.vendor == 'sqlite':
+            # An in-memory database serializes the worker threads on its
+            # shared-cache table locks; a file behaves like production.
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.gettempdir(), 'blog_bench.sqlite3')
+        report = {
+            "options": {key: options[key] for key in (
+                'articles', 'comments', 'skew', 'requests', 'concurrency', 'seed')},
+            "targets": {},
+        }
+        for target in options['targets']:
+            # The write routes add tens of thousands of rows, so every target
+            # gets a freshly created and seeded database of its own.
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                report['targets'][target] = self.run(target, options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        regressions = []
+        if baseline is not None:
+            report['comparison'] = compare(report, baseline)
+            if options['max_regression'] is not None:
+                regressions = [
+                    f"{target} {route}: p95 {change['p95_change']:+.0%}"
+                    for target, routes in report['comparison'].items()
+                    for route, change in routes.items()
+                    if change['p95_change'] > options['max_regression']
+                ]
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + "\n")
+        else:
+            self.stdout.write(output)
+        if regressions:
+            raise CommandError("p95 regressions over the baseline:\n" + "\n".join(regressions))
+
+    def run(self, target, options):
+        user = User.objects.create_user(username='bench', password='bench')
+        seed_articles([user.id], options['articles'], options['comments'], options['skew'], seed=options['seed'])
+        self.user = user
+        self.rng = random.Random(options['seed'])
+        self.names = count()
+        self.articles = Article.objects.aggregate(first=Min('id'), last=Max('id'))
+        self.comments = Comment.objects.aggregate(first=Min('id'), last=Max('id'))
+        self.headers = self.session_headers(user)
+
+        urlconf, handler, run_load = TARGETS[target]
+        results = {}
+        with override_settings(ROOT_URLCONF=urlconf, BLOG_METRICS=True):
+            application = handler()
+            for cache in caches.all():
+                cache.clear()
+            for label, view, method, build in self.routes():
+                requests = [(method, *request) for request in build(options['requests'])]
+                get_metrics().reset()
+                latencies, statuses, elapsed = run_load(application, requests, options['concurrency'])
+                series = get_metrics().series.get((view, method))
+                queries = series.queries.sum / len(latencies) if series else None
+                results[label] = dict(summarize(latencies, elapsed), statuses=statuses,
+                                      queries_per_request=queries and round(queries, 2))
+        return results
+
+    def session_headers(self, user):
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+        client.get('/api/token/')
+        cookies = "; ".join(f"{name}={morsel.value}" for name, morsel in client.cookies.items())
+        return (
+            (b"cookie", cookies.encode()),
+            (b"x-csrftoken", client.cookies['csrftoken'].value.encode()),
+            (b"content-type", b"application/json"),
+        )
+
+    def routes(self):
+        # (label, url name, method, build); build(n) returns n (path, query
+        # string, headers, body) requests. Reads pick articles and comments at
+        # random, so the Zipf-hot ones dominate the comment payloads only.
+        headers = self.headers
+        article = lambda: self.rng.randint(self.articles['first'], self.articles['last'])
+        comment = lambda: self.rng.randint(self.comments['first'], self.comments['last'])
+        hot = self.articles['first']
+        body = lambda value: json.dumps(value).encode()
+        get = lambda path, query="": lambda n: [(path(), query, headers, b"") for _ in range(n)]
+        return [
+            ("POST signup", 'signup', 'POST', lambda n: [
+                ('/api/signup/', '', headers, body({"username": f"bench{next(self.names)}", "password": "bench"}))
+                for _ in range(n)]),
+            ("POST signin", 'signin', 'POST', lambda n: [
+                ('/api/signin/', '', headers, body({"username": "bench", "password": "bench"})) for _ in range(n)]),
+            ("GET signout", 'signout', 'GET', lambda n: [
+                ('/api/signout/', '', self.session_headers(self.user), b"") for _ in range(n)]),
+            ("GET article list", 'article_create_list', 'GET', get(lambda: '/api/article/', 'limit=20')),
+            ("GET article list include=comments", 'article_create_list', 'GET',
+             get(lambda: '/api/article/', 'limit=20&include=comments')),
+            ("POST article", 'article_create_list', 'POST', lambda n: [
+                ('/api/article/', '', headers, body({"title": "bench", "content": self.words(30)})) for _ in range(n)]),
+            ("POST article bulk", 'article_bulk_create', 'POST', lambda n: [
+                ('/api/article/bulk/', '', headers,
+                 body([{"title": "bench", "content": self.words(30)} for _ in range(100)]))
+                for _ in range(n)]),
+            ("GET article search", 'article_search', 'GET', lambda n: [
+                ('/api/article/search/', f"q={self.words(2).replace(' ', '+')}", headers, b"")
+                for _ in range(n)]),
+            ("GET article", 'article_retrieve_update_delete', 'GET',
+             get(lambda: f'/api/article/{article()}/')),
+            ("PUT article", 'article_retrieve_update_delete', 'PUT', lambda n: [
+                (f'/api/article/{article()}/', '', headers, body({"title": "bench", "content": self.words(30)}))
+                for _ in range(n)]),
+            ("DELETE article", 'article_retrieve_update_delete', 'DELETE', lambda n: [
+                (f'/api/article/{id}/', '', headers, b"") for id in self.scratch_articles(n)]),
+            ("GET comment list", 'comment_create_list', 'GET', get(lambda: f'/api/article/{article()}/comment/')),
+            ("GET comment list hot", 'comment_create_list', 'GET',
+             get(lambda: f'/api/article/{hot}/comment/', 'limit=20')),
+            ("POST comment", 'comment_create_list', 'POST', lambda n: [
+                (f'/api/article/{article()}/comment/', '', headers, body({"content": self.words(12)}))
+                for _ in range(n)]),
+            ("POST comment bulk", 'comment_bulk_create', 'POST', lambda n: [
+                (f'/api/article/{article()}/comment/bulk/', '', headers,
+                 body([{"content": self.words(12)} for _ in range(100)]))
+                for _ in range(n)]),
+            ("GET comment", 'comment_retrieve_update_delete', 'GET', get(lambda: f'/api/comment/{comment()}/')),
+            ("PUT comment", 'comment_retrieve_update_delete', 'PUT', lambda n: [
+                (f'/api/comment/{comment()}/', '', headers, body({"content": self.words(12)})) for _ in range(n)]),
+            ("DELETE comment", 'comment_retrieve_update_delete', 'DELETE', lambda n: [
+                (f'/api/comment/{id}/', '', headers, b"") for id in self.scratch_comments(n)]),
+            ("GET changes", 'changes', 'GET', get(lambda: '/api/changes/', 'limit=100')),
+            ("GET metrics", 'metrics', 'GET', get(lambda: '/api/metrics/')),
+            ("GET token", 'token', 'GET', get(lambda: '/api/token/')),
+        ]
+
+    def words(self, count):
+        return " ".join(self.rng.choice(WORDS) for _ in range(count))
+
+    def scratch_articles(self, n):
+        # Deletes get rows of their own, so every target deletes as many.
+        return [article.id for article in Article.objects.bulk_create([
+            Article(title="scratch", content="scratch", author=self.user) for _ in range(n)])]
+
+    def scratch_comments(self, n):
+        article = Article.objects.create(title="scratch", content="scratch", author=self.user, comment_count=n)
+        return [comment.id for comment in Comment.objects.bulk_create([
+            Comment(content="scratch", article=article, author=self.user) for _ in range(n)])]
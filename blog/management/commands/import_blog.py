@@ -0,0 +1,80 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DatabaseError, connection
+from django.db.models import Max
+
+from blog.caching import bump_version, invalidate
+from blog.models import User
+from blog.ndjson import TYPES, import_batch, open_input
+
+
+class Command(BaseCommand):
+    help = (
+        "Load articles and comments from an NDJSON export (gzip detected automatically), keeping "
+        "their ids and timestamps. Each batch is one bulk insert in its own transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="File to read, or - for stdin.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--resume', action='store_true',
+                            help="Skip rows up to the highest article and comment ids already in the database, "
+                                 "to continue an interrupted import.")
+
+    def handle(self, *args, **options):
+        # Ids only increase within a type, so rows at or below the last id seen
+        # are skipped; that also drops lines repeated by a resumed export.
+        after = {type: 0 for type in TYPES}
+        if options['resume']:
+            for type, (model, _, _) in TYPES.items():
+                after[type] = model.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        self.imported = self.skipped = 0
+        batch, batch_type, line_number = [], None, 0
+        stream = open_input(options['input'])
+        try:
+            for line_number, line in enumerate(stream, 1):
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                    type, id = item['type'], item['id']
+                except (ValueError, KeyError, TypeError):
+                    type = None
+                if type not in TYPES or not isinstance(id, int):
+                    raise CommandError(f"Line {line_number}: not an exported article or comment.")
+                if id <= after[type]:
+                    self.skipped += 1
+                    continue
+                after[type] = id
+                if batch and (type != batch_type or len(batch) >= options['batch_size']):
+                    self.flush(batch_type, batch, line_number - 1)
+                    batch = []
+                batch.append(item)
+                batch_type = type
+            if batch:
+                self.flush(batch_type, batch, line_number)
+        finally:
+            if self.imported:
+                reset_sequences()
+                invalidate(bump_version, "articles")
+            if options['input'] != '-':
+                stream.close()
+        self.stdout.write(f"Imported {self.imported} rows, skipped {self.skipped}.")
+
+    def flush(self, type, batch, line_number):
+        try:
+            import_batch(type, batch)
+        except (KeyError, TypeError, ValueError, DatabaseError) as e:
+            raise CommandError(f"Batch of {type}s ending at line {line_number}: {e!r}")
+        self.imported += len(batch)
+
+
+def reset_sequences():
+    # Rows were inserted with explicit ids; move the id sequences past them
+    # (a no-op on SQLite), as loaddata does.
+    models = [User, *(model for model, _, _ in TYPES.values())]
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
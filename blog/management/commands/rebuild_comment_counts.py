@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from blog.caching import bump_version, invalidate, invalidate_article
+from blog.models import Article, Comment
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Article.comment_count from the comment table, one id range per transaction, "
+        "and fix the rows that drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        counts = (Comment.objects.filter(article=OuterRef('pk')).order_by()
+                  .values('article').annotate(count=Count('id')).values('count'))
+        last_id = Article.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        fixed = 0
+        for start in range(0, last_id, batch_size):
+            with transaction.atomic():
+                drifted = list(
+                    Article.objects.filter(id__gt=start, id__lte=start + batch_size)
+                    .annotate(actual=Coalesce(Subquery(counts), 0))
+                    .exclude(comment_count=F('actual'))
+                    .select_for_update()
+                    .only('id', 'comment_count')
+                )
+                now = timezone.now()
+                for article in drifted:
+                    article.comment_count = article.actual
+                    article.updated_at = now
+                    invalidate(invalidate_article, article.id)
+                    invalidate(bump_version, f"article:{article.id}")
+                Article.objects.bulk_update(drifted, ['comment_count', 'updated_at'])
+            fixed += len(drifted)
+        if fixed:
+            invalidate(bump_version, "articles")
+        self.stdout.write(f"Fixed comment_count on {fixed} articles.")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.search import is_supported, reindex
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the article and comment full-text search index in one transaction, inserting one id range "
+        "at a time. Searches see the old index until it commits; writes wait for it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        if not is_supported(options['database']):
+            raise CommandError("Full-text search requires SQLite FTS5.")
+        indexed = reindex(options['batch_size'], using=options['database'])
+        self.stdout.write(f"Indexed {indexed} documents.")
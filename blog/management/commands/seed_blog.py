@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.caching import bump_version, invalidate
+from blog.seed import seed_articles, seed_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate users, articles and comments for load testing with batched bulk inserts. "
+        "Comments per article follow a Zipf distribution; all users share one password."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--articles', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=100000)
+        parser.add_argument('--skew', type=float, default=1.0, help="Zipf exponent of comments per article.")
+        parser.add_argument('--password', default='password')
+        parser.add_argument('--username-prefix', default='user')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or (options['articles'] < 1 and options['comments'] > 0):
+            raise CommandError("Comments need at least one article, and everything needs a user.")
+        self.start = time.perf_counter()
+        self.verbose = options['verbosity'] > 1
+        authors = seed_users(options['users'], options['password'], options['username_prefix'],
+                             options['batch_size'], self.progress)
+        if options['articles']:
+            seed_articles(authors, options['articles'], options['comments'], options['skew'],
+                          options['batch_size'], options['seed'], self.progress)
+        invalidate(bump_version, "articles")
+        self.stdout.write(
+            f"Created {len(authors)} users, {options['articles']} articles and {options['comments']} comments "
+            f"in {time.perf_counter() - self.start:.1f}s."
+        )
+
+    def progress(self, model, inserted):
+        if not self.verbose:
+            return
+        elapsed = time.perf_counter() - self.start
+        self.stdout.write(f"{model._meta.verbose_name_plural}: {inserted} ({elapsed:.1f}s)")
@@ -0,0 +1,112 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+# Per-process request metrics, rendered in the Prometheus text format by
+# blog.views.metrics. Each process reports its own series; Prometheus sums them
+# across instances.
+
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+class QueryTimer:
+    # A connection.execute_wrapper counting the queries of one request.
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Series:
+
+    def __init__(self):
+        self.latency = Histogram(settings.BLOG_METRICS_LATENCY_BUCKETS)
+        self.queries = Histogram(settings.BLOG_METRICS_QUERY_BUCKETS)
+        self.size = Histogram(settings.BLOG_METRICS_SIZE_BUCKETS)
+        self.query_seconds = 0.0
+
+
+class RequestMetrics:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def observe(self, view, method, latency, queries, query_seconds, size):
+        if method not in METHODS:
+            method = 'other'
+        with self.lock:
+            series = self.series.get((view, method))
+            if series is None:
+                series = self.series[(view, method)] = Series()
+            series.latency.observe(latency)
+            series.queries.observe(queries)
+            series.query_seconds += query_seconds
+            if size is not None:
+                series.size.observe(size)
+
+    def reset(self):
+        with self.lock:
+            self.series = {}
+
+    def render(self):
+        with self.lock:
+            series = sorted(self.series.items())
+            lines = []
+            for name, kind, help, value in [
+                ('blog_request_duration_seconds', 'histogram', "Request latency.", lambda s: s.latency),
+                ('blog_request_queries', 'histogram', "SQL queries per request.", lambda s: s.queries),
+                ('blog_request_query_duration_seconds_total', 'counter', "Time spent in SQL.",
+                 lambda s: s.query_seconds),
+                ('blog_response_size_bytes', 'histogram', "Response body size, streaming responses excluded.",
+                 lambda s: s.size),
+            ]:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for (view, method), s in series:
+                    labels = f'view="{escape(view)}",method="{method}"'
+                    if kind == 'counter':
+                        lines.append(f"{name}{{{labels}}} {value(s)}")
+                    else:
+                        lines.extend(render_histogram(name, labels, value(s)))
+        return "\n".join(lines) + "\n"
+
+
+def render_histogram(name, labels, histogram):
+    cumulative = 0
+    for bound, count in zip([*histogram.buckets, '+Inf'], histogram.counts):
+        cumulative += count
+        yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+    yield f"{name}_sum{{{labels}}} {histogram.sum}"
+    yield f"{name}_count{{{labels}}} {cumulative}"
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+_metrics = RequestMetrics()
+
+def get_metrics():
+    return _metrics
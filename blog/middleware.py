@@ -0,0 +1,125 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from blog.caching import get_version
+from blog.metrics import QueryTimer, get_metrics
+from blog.querydetector import QueryDetector, logger as query_logger
+from blog.routers import use_primary
+
+
+class MetricsMiddleware:
+    # Outermost, so the session and auth queries count too. Writes handed to
+    # the write queue run on its thread and are not counted.
+
+    def __init__(self, get_response):
+        if not settings.BLOG_METRICS:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        latency = time.perf_counter() - start
+        match = request.resolver_match
+        view = (match.url_name or match.route) if match else 'unmatched'
+        size = None if response.streaming else len(response.content)
+        get_metrics().observe(view, request.method, latency, timer.count, timer.seconds, size)
+        return response
+
+
+class QueryDetectorMiddleware:
+    # For staging: logs slow queries with their view and stack, and query
+    # shapes repeated BLOG_QUERY_REPEAT_THRESHOLD times in one request.
+
+    def __init__(self, get_response):
+        if not settings.BLOG_QUERY_DETECTOR:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        describe = lambda: f"{request.method} {request.path} ({describe_view(request)})"
+        with QueryDetector(describe, settings.BLOG_SLOW_QUERY_MS) as detector:
+            response = self.get_response(request)
+        for shape, count in detector.repeated(settings.BLOG_QUERY_REPEAT_THRESHOLD):
+            query_logger.warning("possible N+1 in %s: %d x %s", describe(), count, shape)
+        return response
+
+
+def describe_view(request):
+    match = request.resolver_match
+    return match.view_name if match else 'unresolved'
+
+
+class ReplicaStickinessMiddleware:
+    cookie_name = 'blog_primary_until'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        unsafe = request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+        token = use_primary.set(unsafe or self.is_sticky(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            use_primary.reset(token)
+        if unsafe and response.status_code < 400:
+            window = settings.BLOG_REPLICA_STICKY_SECONDS
+            response.set_cookie(self.cookie_name, str(time.time() + window), max_age=window,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def is_sticky(self, request):
+        try:
+            return float(request.COOKIES.get(self.cookie_name, 0)) > time.time()
+        except ValueError:
+            return False
+
+
+def get_cached_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = load_user(request)
+    return request._cached_user
+
+def load_user(request):
+    # Keyed by session; an entry is only trusted while the user's version
+    # counter (bumped on every User save or delete, e.g. a password change)
+    # and the session auth hash still match. Logout flushes the session, so
+    # the session lookup above the cache already comes back empty.
+    session = request.session
+    user_id = session.get(auth.SESSION_KEY)
+    if user_id is None or not session.session_key or not settings.BLOG_AUTH_CACHE_TIMEOUT:
+        return auth.get_user(request)
+    cache = caches[settings.BLOG_AUTH_CACHE_ALIAS]
+    key = f"blog:auth:{session.session_key}"
+    entry = cache.get(key)
+    if entry is not None:
+        user, version = entry
+        if (str(user.pk) == str(user_id) and version == get_version(f"user:{user.pk}")
+                and constant_time_compare(session.get(auth.HASH_SESSION_KEY, ''), user.get_session_auth_hash())):
+            return user
+    version = get_version(f"user:{user_id}")
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        cache.set(key, (user, version), settings.BLOG_AUTH_CACHE_TIMEOUT)
+    return user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_cached_user(request))
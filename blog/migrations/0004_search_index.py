@@ -0,0 +1,100 @@
+from django.db import migrations
+
+# One FTS5 row per article (rowid 2 * id) and per comment (rowid 2 * id + 1),
+# so the triggers replace a document by rowid instead of scanning the index.
+# Both carry article_id for grouping hits into articles.
+CREATE_TABLE_SQL = [
+    """
+    CREATE VIRTUAL TABLE blog_search USING fts5(
+        title, content, article_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+]
+
+# SQLite drops these whenever a migration rebuilds blog_article or
+# blog_comment; such migrations must run them again.
+TRIGGER_SQL = [
+    """
+    CREATE TRIGGER blog_search_article_insert AFTER INSERT ON blog_article BEGIN
+        INSERT INTO blog_search (rowid, title, content, article_id)
+        VALUES (2 * new.id, new.title, new.content, new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER blog_search_article_update AFTER UPDATE OF title, content ON blog_article BEGIN
+        DELETE FROM blog_search WHERE rowid = 2 * old.id;
+        INSERT INTO blog_search (rowid, title, content, article_id)
+        VALUES (2 * new.id, new.title, new.content, new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER blog_search_article_delete AFTER DELETE ON blog_article BEGIN
+        DELETE FROM blog_search WHERE rowid = 2 * old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER blog_search_comment_insert AFTER INSERT ON blog_comment BEGIN
+        INSERT INTO blog_search (rowid, title, content, article_id)
+        VALUES (2 * new.id + 1, '', new.content, new.article_id);
+    END
+    """,
+    """
+    CREATE TRIGGER blog_search_comment_update AFTER UPDATE OF content, article_id ON blog_comment BEGIN
+        DELETE FROM blog_search WHERE rowid = 2 * old.id + 1;
+        INSERT INTO blog_search (rowid, title, content, article_id)
+        VALUES (2 * new.id + 1, '', new.content, new.article_id);
+    END
+    """,
+    """
+    CREATE TRIGGER blog_search_comment_delete AFTER DELETE ON blog_comment BEGIN
+        DELETE FROM blog_search WHERE rowid = 2 * old.id + 1;
+    END
+    """,
+]
+
+BACKFILL_SQL = [
+    """
+    INSERT INTO blog_search (rowid, title, content, article_id)
+    SELECT 2 * id, title, content, id FROM blog_article
+    """,
+    """
+    INSERT INTO blog_search (rowid, title, content, article_id)
+    SELECT 2 * id + 1, '', content, article_id FROM blog_comment
+    """,
+]
+
+DROP_TRIGGER_SQL = [
+    "DROP TRIGGER IF EXISTS blog_search_article_insert",
+    "DROP TRIGGER IF EXISTS blog_search_article_update",
+    "DROP TRIGGER IF EXISTS blog_search_article_delete",
+    "DROP TRIGGER IF EXISTS blog_search_comment_insert",
+    "DROP TRIGGER IF EXISTS blog_search_comment_update",
+    "DROP TRIGGER IF EXISTS blog_search_comment_delete",
+]
+
+DROP_TABLE_SQL = [
+    "DROP TABLE IF EXISTS blog_search",
+]
+
+
+def run_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_article_comment_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_sqlite(CREATE_TABLE_SQL + TRIGGER_SQL + BACKFILL_SQL),
+            run_sqlite(DROP_TRIGGER_SQL + DROP_TABLE_SQL),
+        ),
+    ]
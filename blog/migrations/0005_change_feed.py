@@ -0,0 +1,70 @@
+import importlib
+
+from django.db import migrations, models
+import django.utils.timezone
+
+search_index = importlib.import_module('blog.migrations.0004_search_index')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_search_index'),
+    ]
+
+    operations = [
+        # Rolling back the columns rebuilds the tables again.
+        migrations.RunPython(
+            migrations.RunPython.noop,
+            search_index.run_sqlite(search_index.DROP_TRIGGER_SQL + search_index.TRIGGER_SQL),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('article', 'Article'), ('comment', 'Comment')], max_length=16)),
+                ('object_id', models.IntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['updated_at', 'id'], name='article_updated_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['updated_at', 'id'], name='comment_updated_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_at_id_idx'),
+        ),
+        # Adding the columns rebuilt blog_article and blog_comment, which
+        # dropped the search triggers.
+        migrations.RunPython(
+            search_index.run_sqlite(search_index.DROP_TRIGGER_SQL + search_index.TRIGGER_SQL),
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.1.2 on 2026-10-18 08:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_change_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tombstone',
+            name='article_id',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['article_id', 'deleted_at', 'id'], name='tombstone_article_idx'),
+        ),
+    ]
@@ -6,11 +6,57 @@ class Article(models.Model):
     id = models.AutoField(primary_key=True)
     title = models.CharField(max_length=64, blank=True)
     content = models.TextField(max_length=1000, blank=True)
-    author = models.ForeignKey(User, on_delete=models.CASCADE)
+    author = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+    # Maintained with F() updates by the comment write paths and, for
+    # cascading deletes, blog.signals; rebuild with
+    # `manage.py rebuild_comment_counts` if it drifts.
+    comment_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Replaces the single-column FK index: serves author lookups and
+            # per-author listings ordered by id.
+            models.Index(fields=['author', 'id'], name='article_author_id_idx'),
+            # The change feed pages through (updated_at, id).
+            models.Index(fields=['updated_at', 'id'], name='article_updated_at_id_idx'),
+        ]
 
 
 class Comment(models.Model):
     id = models.AutoField(primary_key=True)
-    article = models.ForeignKey(Article, on_delete=models.CASCADE)
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, db_index=False)
     content = models.TextField(max_length=1000, blank=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Replaces the single-column FK index: comment lists filter by
+            # article and page by id, so this stays a range scan.
+            models.Index(fields=['article', 'id'], name='comment_article_id_idx'),
+            models.Index(fields=['updated_at', 'id'], name='comment_updated_at_id_idx'),
+        ]
+
+
+class Tombstone(models.Model):
+    # Records a deleted article or comment for the change feed.
+    ARTICLE = 'article'
+    COMMENT = 'comment'
+    KIND_CHOICES = [(ARTICLE, 'Article'), (COMMENT, 'Comment')]
+
+    id = models.AutoField(primary_key=True)
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    object_id = models.IntegerField()
+    # The article the comment belonged to, or the article itself.
+    article_id = models.IntegerField(null=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_at_id_idx'),
+            # Comment stream replay (blog.events) per article.
+            models.Index(fields=['article_id', 'deleted_at', 'id'], name='tombstone_article_idx'),
+        ]
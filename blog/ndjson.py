@@ -0,0 +1,128 @@
+import gzip
+import json
+import sys
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import CommandError
+from django.db import connections, transaction
+from django.utils.dateparse import parse_datetime
+
+from blog.models import Article, Comment, User
+
+# Articles and comments as newline-delimited JSON, one object per line tagged
+# with its type: all articles in id order, then all comments in id order, so
+# a comment always follows its article. Authors travel as usernames.
+
+TYPES = {
+    'article': (Article, {'author__username': 'author'}, ['title', 'content', 'comment_count']),
+    'comment': (Comment, {'author__username': 'author', 'article_id': 'article'}, ['content']),
+}
+TIMESTAMPS = ['created_at', 'updated_at']
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def open_output(path, offset=None):
+    # Resuming truncates whatever was written after the checkpoint offset.
+    if path == '-':
+        return sys.stdout.buffer
+    if offset is None:
+        return open(path, 'wb')
+    try:
+        stream = open(path, 'r+b')
+    except FileNotFoundError:
+        raise CommandError(f"{path} is missing; delete the checkpoint to export from the start.")
+    stream.truncate(offset)
+    stream.seek(offset)
+    return stream
+
+def encode_batch(lines, compress):
+    # Compressed batches are complete gzip members: gzip readers treat the
+    # concatenation as one stream, and an export cut off mid-batch can be
+    # truncated back to the last whole member.
+    data = b"".join(lines)
+    return gzip.compress(data, compresslevel=6) if compress else data
+
+def open_input(path):
+    # Gzip is detected from the magic bytes rather than the file name.
+    if path == '-':
+        stream = sys.stdin.buffer
+        return gzip.GzipFile(fileobj=stream, mode='rb') if stream.peek(2)[:2] == GZIP_MAGIC else stream
+    with open(path, 'rb') as f:
+        compressed = f.read(2) == GZIP_MAGIC
+    return gzip.open(path, 'rb') if compressed else open(path, 'rb')
+
+@contextmanager
+def read_snapshot(using):
+    # One read transaction for the whole export, so a comment written meanwhile
+    # can't reference an article the export has already passed. SQLite in WAL
+    # mode reads from one snapshot per transaction; PostgreSQL only does at
+    # REPEATABLE READ.
+    connection = connections[using]
+    deferred = getattr(connection, 'deferred_transactions', nullcontext)
+    with deferred(), transaction.atomic(using=using):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        yield
+
+def export_batches(type, after_id, batch_size, using, **filters):
+    # Keyset pagination: one short query per batch instead of a cursor held
+    # open for the whole export. Yields lists of encoded lines and the last id.
+    model, related, fields = TYPES[type]
+    columns = ['id', *related, *fields, *TIMESTAMPS]
+    queryset = model.objects.using(using).filter(**filters).order_by('id').values(*columns)
+    while True:
+        rows = list(queryset.filter(id__gt=after_id)[:batch_size])
+        if not rows:
+            return
+        after_id = rows[-1]['id']
+        yield [encode(type, related, row) for row in rows], after_id
+
+def encode(type, related, row):
+    for column, name in related.items():
+        row[name] = row.pop(column)
+    # isoformat, not DjangoJSONEncoder: that rounds to milliseconds and the
+    # change feed orders by microsecond.
+    return (json.dumps({'type': type, **row}, default=datetime.isoformat) + "\n").encode()
+
+def import_batch(type, items):
+    model, related, fields = TYPES[type]
+    authors = get_authors({item['author'] for item in items})
+    objs = []
+    for item in items:
+        obj = model(id=item['id'], author_id=authors[item['author']],
+                    **{field: item[field] for field in fields},
+                    **{field: parse_datetime(item[field]) for field in TIMESTAMPS})
+        if type == 'comment':
+            obj.article_id = item['article']
+        objs.append(obj)
+    with transaction.atomic(), keep_timestamps(model):
+        model.objects.bulk_create(objs)
+
+def get_authors(usernames):
+    # Users missing from this database are created without a usable password.
+    authors = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+    missing = [User(username=username, password=make_password(None))
+               for username in usernames if username not in authors]
+    if missing:
+        User.objects.bulk_create(missing)
+        authors.update(User.objects.filter(username__in=[user.username for user in missing])
+                       .values_list('username', 'id'))
+    return authors
+
+@contextmanager
+def keep_timestamps(model):
+    # bulk_create would stamp auto_now/auto_now_add fields with the current
+    # time; imported rows keep the exported ones. Process-wide, so only for
+    # management commands.
+    fields = [model._meta.get_field(name) for name in TIMESTAMPS]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
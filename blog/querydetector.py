@@ -0,0 +1,93 @@
+import logging
+import re
+import time
+import traceback
+from collections import Counter
+from contextlib import ContextDecorator, ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+# Groups the queries run inside a block by SQL shape. Repeated shapes are the
+# signature of N+1 lookups; queries slower than a threshold are logged with
+# the code that issued them. Used by QueryDetectorMiddleware in staging and by
+# query_budget in tests.
+
+logger = logging.getLogger('blog.queries')
+
+IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+
+
+def query_shape(sql):
+    # Parameters are already placeholders; only IN lists vary with the data.
+    return IN_LIST.sub("IN (...)", sql)
+
+def project_stack():
+    base_dir = str(settings.BASE_DIR)
+    frames = [frame for frame in traceback.extract_stack()[:-3]
+              if frame.filename.startswith(base_dir) and frame.filename != __file__]
+    return "".join(traceback.format_list(frames))
+
+
+class QueryDetector:
+
+    def __init__(self, describe=lambda: "block", slow_ms=None):
+        self.describe = describe
+        self.slow_ms = slow_ms
+        self.count = 0
+        self.shapes = Counter()
+        self.stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.count += 1
+            self.shapes[query_shape(sql)] += 1
+            if self.slow_ms is not None and elapsed_ms >= self.slow_ms:
+                logger.warning("slow query (%.1f ms) in %s: %s\n%s",
+                               elapsed_ms, self.describe(), sql, project_stack())
+
+    def __enter__(self):
+        self.stack = ExitStack()
+        for connection in connections.all():
+            self.stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stack.close()
+
+    def repeated(self, threshold):
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class query_budget(ContextDecorator):
+    # Fails the block (or decorated test) if it runs more than max_queries
+    # queries, or any single shape at least repeat_threshold times.
+
+    def __init__(self, max_queries, repeat_threshold=None):
+        self.max_queries = max_queries
+        self.repeat_threshold = repeat_threshold or settings.BLOG_QUERY_REPEAT_THRESHOLD
+
+    def __enter__(self):
+        self.detector = QueryDetector().__enter__()
+        return self.detector
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.detector.__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return False
+        problems = []
+        if self.detector.count > self.max_queries:
+            problems.append(f"{self.detector.count} queries, budget is {self.max_queries}")
+        for shape, count in self.detector.repeated(self.repeat_threshold):
+            problems.append(f"{count} x {shape}")
+        if problems:
+            raise QueryBudgetExceeded("\n".join(problems))
+        return False
@@ -0,0 +1,35 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Set by ReplicaStickinessMiddleware for requests that must see the primary:
+# writes themselves and reads shortly after the same client wrote.
+use_primary = ContextVar('blog_use_primary', default=False)
+
+
+def reads_from_primary():
+    # Shared response caches are only filled from primary reads: a body read
+    # from a lagging replica would be cached under the post-write version and
+    # served to the writer too.
+    return not settings.BLOG_READ_REPLICAS or use_primary.get()
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'blog' or not settings.BLOG_READ_REPLICAS or use_primary.get():
+            return None
+        return random.choice(settings.BLOG_READ_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        # Also covers saving an instance that was read from a replica.
+        if model._meta.app_label != 'blog':
+            return None
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *settings.BLOG_READ_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
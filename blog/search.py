@@ -0,0 +1,59 @@
+from django.db import connections, transaction
+from django.db.models import Max
+
+from blog.models import Article, Comment
+
+# Full-text search over the blog_search FTS5 table created by migration 0004.
+# Triggers keep it in sync with blog_article and blog_comment; reindex()
+# rebuilds it from scratch in one transaction.
+
+TITLE_WEIGHT = 10.0
+CONTENT_WEIGHT = 1.0
+
+SEARCH_SQL = f"""
+    SELECT article_id, MIN(rank) AS best FROM (
+        SELECT article_id, bm25(blog_search, {TITLE_WEIGHT}, {CONTENT_WEIGHT}) AS rank
+        FROM blog_search WHERE blog_search MATCH %s
+        LIMIT -1
+    )
+    GROUP BY article_id ORDER BY best, article_id LIMIT %s OFFSET %s
+"""
+
+
+def is_supported(using):
+    return connections[using].vendor == 'sqlite'
+
+def match_expression(q):
+    # Quote every term so user input is never parsed as FTS5 query syntax;
+    # adjacent phrases are ANDed.
+    terms = q.split()
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+def search_articles(q, offset, limit, using):
+    # Returns (article_id, rank) pairs, best first; an article matches through
+    # its own text or any of its comments.
+    with connections[using].cursor() as cursor:
+        cursor.execute(SEARCH_SQL, [match_expression(q), limit, offset])
+        return cursor.fetchall()
+
+def reindex(batch_size, using='default'):
+    # One transaction: readers keep seeing the old index until it commits, and
+    # writers (whose triggers would collide with the re-inserted rowids) wait.
+    # Batches only bound the size of each INSERT ... SELECT.
+    connection = connections[using]
+    indexed = 0
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute("DELETE FROM blog_search")
+        for model, sql in [
+            (Article, "INSERT INTO blog_search (rowid, title, content, article_id) "
+                      "SELECT 2 * id, title, content, id FROM blog_article WHERE id > %s AND id <= %s"),
+            (Comment, "INSERT INTO blog_search (rowid, title, content, article_id) "
+                      "SELECT 2 * id + 1, '', content, article_id FROM blog_comment WHERE id > %s AND id <= %s"),
+        ]:
+            last_id = model.objects.using(using).aggregate(last_id=Max('id'))['last_id'] or 0
+            for start in range(0, last_id, batch_size):
+                cursor.execute(sql, [start, start + batch_size])
+                indexed += cursor.rowcount
+    with connection.cursor() as cursor:
+        cursor.execute("INSERT INTO blog_search (blog_search) VALUES ('optimize')")
+    return indexed
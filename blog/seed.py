@@ -0,0 +1,74 @@
+import random
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from blog.models import Article, Comment, User
+
+# Synthetic data for benchmarks and load tests. Rows are generated lazily and
+# inserted one batch per transaction, so memory stays flat however many are
+# requested.
+
+WORDS = ["django", "python", "sqlite", "async", "cache", "index", "query", "stream",
+         "search", "comment", "article", "server", "thread", "latency", "replica", "signal"]
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def zipf_counts(total, n, skew):
+    # Splits total over n ranks with weight 1 / rank ** skew; the running
+    # remainder is carried so the counts add up to total.
+    norm = sum(rank ** -skew for rank in range(1, n + 1))
+    expected = 0.0
+    emitted = 0
+    for rank in range(1, n + 1):
+        expected += total * rank ** -skew / norm
+        count = min(round(expected), total) - emitted
+        emitted += count
+        yield count
+
+def words(rng, count):
+    return " ".join(rng.choices(WORDS, k=count))
+
+def insert(model, objs, batch_size, progress=None):
+    inserted = 0
+    for batch in batched(objs, batch_size):
+        with transaction.atomic():
+            model.objects.bulk_create(batch)
+        inserted += len(batch)
+        if progress:
+            progress(model, inserted)
+    return inserted
+
+def seed_users(users, password, prefix="user", batch_size=5000, progress=None):
+    # One PBKDF2 run for all of them: every user gets the same hash, so they
+    # can all sign in with password. Returns the ids of the new users.
+    last_id = User.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    password = make_password(password)
+    insert(User, (
+        User(username=f"{prefix}{last_id + i}", password=password) for i in range(1, users + 1)
+    ), batch_size, progress)
+    return list(User.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True))
+
+def seed_articles(authors, articles, comments, skew=1.0, batch_size=5000, seed=0, progress=None):
+    # Article i (in id order) gets the i-th Zipf share of the comments, so the
+    # oldest articles are the hottest. Authors are picked at random from the
+    # given user ids. Returns a queryset of the new articles.
+    rng = random.Random(seed)
+    last_id = Article.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    insert(Article, (
+        Article(title=f"title {i} {words(rng, 3)}", content=words(rng, 30), author_id=rng.choice(authors),
+                comment_count=count)
+        for i, count in enumerate(zipf_counts(comments, articles, skew))
+    ), batch_size, progress)
+    counts = (Article.objects.filter(id__gt=last_id).order_by('id')
+              .values_list('id', 'comment_count').iterator(chunk_size=batch_size))
+    insert(Comment, (
+        Comment(content=words(rng, 12), article_id=article_id, author_id=rng.choice(authors))
+        for article_id, count in counts for _ in range(count)
+    ), batch_size, progress)
+    return Article.objects.filter(id__gt=last_id)
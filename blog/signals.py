@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from blog.caching import bump_version, invalidate, invalidate_article, invalidate_comment_list
+from blog.models import Article, Comment
+from blog.views import add_comment_count
+
+
+@receiver(post_save, sender=Article)
+def article_saved(sender, instance, **kwargs):
+    invalidate(invalidate_article, instance.id)
+    invalidate(bump_version, f"article:{instance.id}")
+    invalidate(bump_version, "articles")
+
+@receiver(post_delete, sender=Article)
+def article_deleted(sender, instance, **kwargs):
+    invalidate(invalidate_article, instance.id)
+    invalidate(bump_version, f"article:{instance.id}")
+    invalidate(bump_version, "articles")
+    # Stop serving the cached comment list so the next read falls through to 404.
+    invalidate(invalidate_comment_list, instance.id)
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, **kwargs):
+    # Drops cached users for every session (blog.middleware.load_user).
+    invalidate(bump_version, f"user:{instance.pk}")
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    invalidate(invalidate_comment_list, instance.article_id)
+    invalidate(bump_version, f"comment:{instance.id}")
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, origin=None, **kwargs):
+    # Cascades, e.g. deleting a user deletes their comments on other people's
+    # articles; the update joins the delete's transaction. Nothing to count
+    # when the article goes too.
+    if getattr(instance, 'comment_count_handled', False):
+        return
+    if isinstance(origin, Article) and origin.id == instance.article_id:
+        return
+    if isinstance(origin, QuerySet) and origin.model is Article:
+        return
+    add_comment_count(instance.article_id, -1)
+
+
+def apply_sqlite_pragmas(connection, pragmas):
+    for name, value in pragmas.items():
+        connection.execute(f"PRAGMA {name} = {value}")
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    # Runs once per new connection; with CONN_MAX_AGE the connection and its
+    # pragmas are reused across requests.
+    if connection.vendor == 'sqlite':
+        apply_sqlite_pragmas(connection.connection, settings.BLOG_SQLITE_PRAGMAS)
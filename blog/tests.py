@@ -1,6 +1,73 @@
-from django.test import TestCase, Client
+from django.core.cache import caches
+from django.db import DatabaseError, OperationalError, connection
+from django.db.backends.sqlite3 import base as sqlite3_backend
+import asyncio
+import gzip
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db.models import Count, F, Max
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase, Client, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 import json
+from blog.backends.sqlite3 import base as blog_sqlite3_backend
+from blog.bench import asgi_request, asgi_scope, compare, response_body, response_status, wsgi_request
+from blog.changes import decode_cursor
+from blog.events import comment_topic, get_broker
+from blog.handlers import BlogASGIHandler
+from blog.metrics import get_metrics
+from blog.querydetector import QueryBudgetExceeded, query_budget, query_shape
 from blog.models import User, Article, Comment
+from blog.routers import PrimaryReplicaRouter, use_primary
+from blog.seed import seed_articles, zipf_counts
+from blog.signals import apply_sqlite_pragmas
+from blog.views import create_comment, delete_comment
+from blog.writer import WriteQueue, get_write_queue
+from myblog.asgi import application as asgi_application
+
+
+# Query counts assume sessions and users come from caches shared by all
+# workers, as in a deployment with SESSION_CACHE_ALIAS and the blog caches on
+# Redis or Memcached. The test process is the only worker, so its LocMem
+# caches stand in for them.
+shared_caches = override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+                                  BLOG_AUTH_CACHE_TIMEOUT=30)
+
+
+class LoggedInTestCase(TestCase):
+    # testuser, logged in, with every cache emptied first.
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.test_user = User.objects.create_user(username="testuser", password="password")
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.client.force_login(self.test_user)
+
+
+class ArticleTestCase(LoggedInTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.article = Article.objects.create(
+            title="test article title",
+            content="test article content",
+            author=cls.test_user
+        )
 
 
 class BlogTestCase(TestCase):
@@ -54,6 +121,10 @@ class BlogTestCase(TestCase):
                     author=cls.test_stranger,
                     article=cls.articles[3]
             ))
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
         
 
     def test_csrf(self):
@@ -218,6 +289,105 @@ class BlogTestCase(TestCase):
         )
         self.assertEqual(response.status_code, 401)
 
+    def test_paginate_articles(self):
+        response = self.client.post(
+            "/api/signin/",
+            data=self.user_data,
+            content_type="application/json"
+        )
+        all_ids = sorted(article.id for article in Article.objects.all())
+
+        response = self.client.get("/api/article/?limit=4")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([x['id'] for x in data['results']], all_ids[:4])
+        self.assertEqual(data['next'], all_ids[3])
+
+        seen = []
+        cursor = 0
+        while cursor is not None:
+            data = self.client.get(f"/api/article/?after={cursor}&limit=5").json()
+            seen.extend(x['id'] for x in data['results'])
+            cursor = data['next']
+        self.assertEqual(seen, all_ids)
+
+        data = self.client.get(f"/api/article/?after={all_ids[-1]}").json()
+        self.assertEqual(data, {"results": [], "next": None})
+
+        for query in ["limit=0", "limit=abc", "after=-1", "after=x", "after=99999999999999999999",
+                      "limit=99999999999999999999", "stream=1&after=99999999999999999999"]:
+            response = self.client.get(f"/api/article/?{query}")
+            self.assertEqual(response.status_code, 400)
+
+    @override_settings(BLOG_MAX_PAGE_SIZE=3, BLOG_UNPAGINATED_MAX=5)
+    def test_paginate_articles_limits(self):
+        response = self.client.post(
+            "/api/signin/",
+            data=self.user_data,
+            content_type="application/json"
+        )
+        data = self.client.get("/api/article/?limit=50").json()
+        self.assertEqual(len(data['results']), 3)
+
+        response = self.client.get("/api/article/")
+        data = response.json()
+        self.assertEqual(len(data), 5)
+        self.assertEqual(int(response['X-Next-Cursor']), data[-1]['id'])
+
+    @override_settings(BLOG_STREAM_CHUNK_SIZE=4, BLOG_UNPAGINATED_MAX=5)
+    def test_stream_articles(self):
+        response = self.client.post(
+            "/api/signin/",
+            data=self.user_data,
+            content_type="application/json"
+        )
+        response = self.client.get("/api/article/?stream=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        data = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(len(data), len(self.articles)+1)
+        self.assertEqual([x['id'] for x in data], sorted(x['id'] for x in data))
+        self.assertEqual(data[1]['title'], self.articles[0].title)
+        self.assertEqual(data[1]['author'], self.test_user.id)
+
+        response = self.client.get(f"/api/article/?stream=1&after={self.articles[-1].id}")
+        self.assertEqual(json.loads(b"".join(response.streaming_content)), [])
+
+    def test_session_engine(self):
+        # Another worker would keep its LocMem copy of a session after logout.
+        self.assertEqual(settings.CACHES[settings.SESSION_CACHE_ALIAS]['BACKEND'],
+                         'django.core.cache.backends.locmem.LocMemCache')
+        self.assertEqual(settings.SESSION_ENGINE, 'django.contrib.sessions.backends.db')
+        # Nor would it drop its cached user after a password change.
+        self.assertEqual(settings.BLOG_AUTH_CACHE_TIMEOUT, 0)
+
+    @shared_caches
+    def test_batch_articles(self):
+        response = self.client.post(
+            "/api/signin/",
+            data=self.user_data,
+            content_type="application/json"
+        )
+        ids = [self.articles[3].id, 9999, self.articles[1].id, self.articles[3].id]
+        # user (not cached yet right after signin), articles
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/api/article/?ids={','.join(map(str, ids))}")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([x['id'] for x in data], ids)
+        self.assertEqual(data[0]['title'], self.articles[3].title)
+        self.assertEqual(data[1], {"id": 9999, "missing": True})
+        self.assertNotIn("missing", data[2])
+        self.assertEqual(data[2]['author'], self.test_user.id)
+
+        for query in ["ids=", "ids=1,x", f"ids={','.join(['1'] * 101)}", "ids=99999999999999999999",
+                      "ids=-99999999999999999999"]:
+            response = self.client.get(f"/api/article/?{query}")
+            self.assertEqual(response.status_code, 400)
+        for url in ["/api/article/99999999999999999999/", "/api/article/99999999999999999999/comment/",
+                    "/api/comment/99999999999999999999/"]:
+            self.assertEqual(self.client.get(url).status_code, 404)
+
     def test_retrieve_article(self):
         response = self.client.post(
             "/api/signin/",
@@ -433,6 +603,20 @@ class BlogTestCase(TestCase):
         )
         self.assertEqual(response.status_code, 401)
 
+    def test_stream_comments(self):
+        response = self.client.post(
+            "/api/signin/",
+            data=self.user_data,
+            content_type="application/json"
+        )
+        url = f"/api/article/{self.articles[2].id}/comment/"
+        response = self.client.get(url + "?stream=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(b"".join(response.streaming_content)), self.client.get(url).json())
+
+        response = self.client.get("/api/article/9999/comment/?stream=1")
+        self.assertEqual(response.status_code, 404)
+
     def test_retrieve_comment(self):
         response = self.client.post(
             "/api/signin/",
@@ -566,8 +750,1488 @@ class BlogTestCase(TestCase):
         self.assertEqual(response.status_code, 401)
 
 
-        
+class QueryCountTestCase(ArticleTestCase):
+
+    def count_queries(self, url):
+        for cache in caches.all():
+            cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_list_articles_query_count(self):
+        for size in [10, 100, 1000]:
+            Article.objects.bulk_create([
+                Article(title=f"title..{i}", content=f"content..{i}", author=self.test_user)
+                for i in range(size - Article.objects.count())
+            ])
+            with self.subTest(size=size):
+                self.assertEqual(Article.objects.count(), size)
+                # session, user, articles
+                self.assertEqual(self.count_queries("/api/article/"), 3)
+
+    def test_list_comments_query_count(self):
+        url = f"/api/article/{self.article.id}/comment/"
+        for size in [10, 100, 1000]:
+            Comment.objects.bulk_create([
+                Comment(content=f"content..{i}", author=self.test_user, article=self.article)
+                for i in range(size - Comment.objects.count())
+            ])
+            with self.subTest(size=size):
+                self.assertEqual(Comment.objects.count(), size)
+                # session, user, comments
+                self.assertEqual(self.count_queries(url), 3)
+
+
+@skipUnlessDBFeature('supports_explaining_query_execution')
+class QueryPlanTestCase(ArticleTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Comment.objects.bulk_create([
+            Comment(content=f"content..{i}", author=cls.test_user, article=cls.article)
+            for i in range(100)
+        ])
+
+    def assertIndexRangeScan(self, queryset, index_name):
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            self.assertIn("SEARCH blog_", plan)
+            self.assertIn(index_name, plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_comment_list_uses_article_index(self):
+        comments = Comment.objects.filter(article=self.article.id).order_by('id')
+        self.assertIndexRangeScan(comments, "comment_article_id_idx")
+        self.assertIndexRangeScan(comments.filter(id__gt=50), "comment_article_id_idx")
+
+    def test_author_articles_use_author_index(self):
+        articles = Article.objects.filter(author=self.test_user).order_by('id')
+        self.assertIndexRangeScan(articles, "article_author_id_idx")
+
+
+@shared_caches
+class ArticleCacheTestCase(ArticleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = f"/api/article/{self.article.id}/"
+
+    def test_cached_get(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        # the session, user and article all come from caches
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url)
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(cached.json(), response.json())
+        self.assertEqual(cached['Content-Type'], 'application/json')
+
+        self.client.get("/api/article/9999/")
+        self.assertEqual(self.client.get("/api/article/9999/").status_code, 404)
+
+    def test_put_invalidates(self):
+        self.client.get(self.url)
+        data = {"title": "modified title", "content": "modified content"}
+        response = self.client.put(self.url, data=data, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(self.url).json()['title'], "modified title")
+
+    def test_delete_invalidates(self):
+        self.client.get(self.url)
+        self.assertEqual(self.client.delete(self.url).status_code, 200)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_cascade_delete_invalidates(self):
+        other = User.objects.create_user(username="other", password="password")
+        article = Article.objects.create(title="other", content="other", author=other)
+        url = f"/api/article/{article.id}/"
+        self.assertEqual(self.client.get(url).status_code, 200)
+        other.delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    @override_settings(BLOG_ARTICLE_CACHE_TIMEOUT=0)
+    def test_cache_disabled(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+
+@shared_caches
+class CommentListCacheTestCase(ArticleTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.comment = Comment.objects.create(
+            content="test comment content",
+            author=cls.test_user,
+            article=cls.article
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.url = f"/api/article/{self.article.id}/comment/"
+
+    def test_cached_list(self):
+        response = self.client.get(self.url)
+        # the session, user, article and comments all come from caches
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url)
+        self.assertEqual(cached.json(), response.json())
+
+    def test_writes_bump_version(self):
+        self.client.get(self.url)
+        response = self.client.post(self.url, data={"content": "new"}, content_type="application/json")
+        new_id = response.json()['id']
+        self.assertEqual([x['id'] for x in self.client.get(self.url).json()], [self.comment.id, new_id])
+
+        self.client.put(f"/api/comment/{new_id}/", data={"content": "edited"}, content_type="application/json")
+        self.assertEqual(self.client.get(self.url).json()[1]['content'], "edited")
+
+        self.client.delete(f"/api/comment/{new_id}/")
+        self.assertEqual([x['id'] for x in self.client.get(self.url).json()], [self.comment.id])
+
+    def test_article_delete_bumps_version(self):
+        self.client.get(self.url)
+        self.client.delete(f"/api/article/{self.article.id}/")
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_evicted_version_does_not_reuse_entries(self):
+        self.client.get(self.url)
+        caches['blog'].delete(f"blog:version:comments:{self.article.id}")
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+
+@shared_caches
+class ConditionalGetTestCase(ArticleTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.comment = Comment.objects.create(
+            content="test comment content",
+            author=cls.test_user,
+            article=cls.article
+        )
+
+    def assertRevalidates(self, url, modify):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        # nothing is read or serialized for a match
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b"")
+
+        modify()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response
+
+    def put_article(self):
+        self.client.put(
+            f"/api/article/{self.article.id}/",
+            data={"title": "modified", "content": "modified"},
+            content_type="application/json"
+        )
+
+    def put_comment(self):
+        self.client.put(
+            f"/api/comment/{self.comment.id}/",
+            data={"content": "modified"},
+            content_type="application/json"
+        )
+
+    def test_article_list(self):
+        response = self.assertRevalidates("/api/article/", self.put_article)
+        self.assertEqual(response.json()[0]['title'], "modified")
+        self.assertNotEqual(
+            self.client.get("/api/article/?limit=1")['ETag'],
+            self.client.get("/api/article/")['ETag']
+        )
+
+    def test_article_detail(self):
+        response = self.assertRevalidates(f"/api/article/{self.article.id}/", self.put_article)
+        self.assertEqual(response.json()['title'], "modified")
+
+    def test_comment_list(self):
+        url = f"/api/article/{self.article.id}/comment/"
+        response = self.assertRevalidates(url, self.put_comment)
+        self.assertEqual(response.json()[0]['content'], "modified")
+
+    def test_comment_detail(self):
+        response = self.assertRevalidates(f"/api/comment/{self.comment.id}/", self.put_comment)
+        self.assertEqual(response.json()['content'], "modified")
+
+    def test_process_local_versions_expire(self):
+        self.assertEqual(settings.BLOG_VERSION_TIMEOUT, 60)
+        url = f"/api/article/{self.article.id}/"
+        etag = self.client.get(url)['ETag']
+        # A write in another worker: this process's counter is not bumped.
+        Article.objects.filter(id=self.article.id).update(title="elsewhere")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with mock.patch("time.time", return_value=time.time() + settings.BLOG_VERSION_TIMEOUT):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['title'], "elsewhere")
+
+    def test_deleted_article_is_not_revalidated(self):
+        url = f"/api/article/{self.article.id}/"
+        etag = self.client.get(url)['ETag']
+        self.client.delete(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+
+class RequestBodyTestCase(LoggedInTestCase):
+
+    def test_body_decoded_once(self):
+        data = {"title": "test title", "content": "test content"}
+        with mock.patch("blog.views.json", wraps=json) as json_module:
+            response = self.client.post("/api/article/", data=data, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(json_module.loads.call_count, 1)
+
+    @override_settings(BLOG_MAX_BODY_SIZE=64)
+    def test_oversized_body(self):
+        data = {"title": "test title", "content": "x" * 100}
+        with mock.patch("blog.views.json", wraps=json) as json_module:
+            response = self.client.post("/api/article/", data=data, content_type="application/json")
+        self.assertEqual(response.status_code, 413)
+        json_module.loads.assert_not_called()
+        self.assertFalse(Article.objects.exists())
+
+        response = self.client.post("/api/signup/", data={"username": "x" * 100, "password": "password"},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 413)
+
+    def test_malformed_body(self):
+        for body in ["{not json", b"\xff\xfe", "[1, 2]", '"title"']:
+            with self.subTest(body=body):
+                response = self.client.post("/api/article/", data=body, content_type="application/json")
+                self.assertEqual(response.status_code, 400)
+                response = self.client.post("/api/signin/", data=body, content_type="application/json")
+                self.assertEqual(response.status_code, 400)
+                response = self.client.post("/api/signup/", data=body, content_type="application/json")
+                self.assertEqual(response.status_code, 400)
+
+
+@shared_caches
+class BulkCreateTestCase(ArticleTestCase):
+
+    def test_bulk_create_articles(self):
+        etag = self.client.get("/api/article/")['ETag']
+        data = [{"title": f"bulk title..{i}", "content": f"bulk content..{i}"} for i in range(50)]
+        # savepoint, insert, release
+        with self.assertNumQueries(3):
+            response = self.client.post("/api/article/bulk/", data=data, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        ids = response.json()
+        self.assertEqual(len(ids), 50)
+        articles = Article.objects.in_bulk(ids)
+        self.assertEqual([articles[id].title for id in ids], [x['title'] for x in data])
+        self.assertTrue(all(articles[id].author_id == self.test_user.id for id in ids))
+        self.assertNotEqual(self.client.get("/api/article/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_bulk_create_comments(self):
+        url = f"/api/article/{self.article.id}/comment/"
+        self.assertEqual(self.client.get(url).json(), [])
+        data = [{"content": f"bulk content..{i}"} for i in range(5)]
+        response = self.client.post(url + "bulk/", data=data, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([x['id'] for x in self.client.get(url).json()], response.json())
+
+        response = self.client.post("/api/article/9999/comment/bulk/", data=data, content_type="application/json")
+        self.assertEqual(response.status_code, 404)
+
+    def test_bulk_create_rejects_batch(self):
+        bad = [
+            ({"title": "x"}, None),
+            ([{"title": "ok", "content": "ok"}, {"title": 1, "content": "x"}], 1),
+            ([{"title": "ok", "content": "ok"}, {"title": "x" * 65, "content": "x"}], 1),
+            ([], None),
+        ]
+        for data, index in bad:
+            with self.subTest(data=data):
+                response = self.client.post("/api/article/bulk/", data=data, content_type="application/json")
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['index'], index)
+        self.assertEqual(Article.objects.count(), 1)
+
+        response = self.client.post("/api/article/bulk/", data="[", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get("/api/article/bulk/")
+        self.assertEqual(response.status_code, 405)
+        self.client.logout()
+        response = self.client.post("/api/article/bulk/", data=[], content_type="application/json")
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(BLOG_BULK_MAX_ITEMS=3, BLOG_BULK_MAX_BODY_SIZE=256)
+    def test_bulk_create_limits(self):
+        data = [{"title": "x", "content": "x"}] * 4
+        response = self.client.post("/api/article/bulk/", data=data, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        data = [{"title": "x", "content": "x" * 300}]
+        response = self.client.post("/api/article/bulk/", data=data, content_type="application/json")
+        self.assertEqual(response.status_code, 413)
+
+
+class CommentCountTestCase(ArticleTestCase):
+
+    def comment_count(self):
+        return self.client.get(f"/api/article/{self.article.id}/").json()['comment_count']
+
+    def test_comment_count(self):
+        url = f"/api/article/{self.article.id}/comment/"
+        self.assertEqual(self.comment_count(), 0)
+        ids = [self.client.post(url, data={"content": "x"}, content_type="application/json").json()['id'] for _ in range(3)]
+        self.assertEqual(self.comment_count(), 3)
+        response = self.client.post(url + "bulk/", data=[{"content": "x"}] * 4, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.comment_count(), 7)
+        self.assertEqual(self.client.delete(f"/api/comment/{ids[0]}/").status_code, 200)
+        self.assertEqual(self.comment_count(), 6)
+        articles = self.client.get("/api/article/", {"limit": 10}).json()['results']
+        self.assertEqual(articles[0]['comment_count'], 6)
+        self.assertEqual(Article.objects.get(id=self.article.id).comment_count, Comment.objects.count())
+
+    def test_cascading_delete_updates_comment_count(self):
+        other = User.objects.create_user(username="other", password="password")
+        for author in [other, other, self.test_user, self.test_user]:
+            create_comment(content="x", article=self.article, author=author)
+        self.assertEqual(self.comment_count(), 4)
+        other.delete()
+        self.assertEqual(self.comment_count(), 2)
+        self.assertEqual(Article.objects.get(id=self.article.id).comment_count, 2)
+
+        comment = Comment.objects.first()
+        self.assertEqual(self.client.delete(f"/api/comment/{comment.id}/").status_code, 200)
+        self.assertEqual(self.comment_count(), 1)
+        # A second delete of the same comment finds nothing to count.
+        delete_comment(comment)
+        self.assertEqual(self.comment_count(), 1)
+
+    def test_update_keeps_comment_count(self):
+        Article.objects.filter(id=self.article.id).update(comment_count=5)
+        response = self.client.put(f"/api/article/{self.article.id}/", data={"title": "t", "content": "c"},
+                                   content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['comment_count'], 5)
+        self.assertEqual(Article.objects.get(id=self.article.id).comment_count, 5)
+
+    def test_rebuild_comment_counts(self):
+        other = Article.objects.create(title="other", content="other", author=self.test_user)
+        Comment.objects.bulk_create([Comment(content="x", article=self.article, author=self.test_user)] * 3)
+        Article.objects.filter(id=other.id).update(comment_count=2)
+        self.assertEqual(self.comment_count(), 0)
+        out = StringIO()
+        call_command("rebuild_comment_counts", batch_size=1, stdout=out)
+        self.assertIn("Fixed comment_count on 2 articles.", out.getvalue())
+        self.assertEqual(self.comment_count(), 3)
+        self.assertEqual(Article.objects.get(id=other.id).comment_count, 0)
 
 
+@shared_caches
+class EmbeddedCommentsTestCase(LoggedInTestCase):
 
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.articles = Article.objects.bulk_create([
+            Article(title=f"title..{i}", content=f"content..{i}", author=cls.test_user) for i in range(3)
+        ])
+        cls.comments = {}
+        for count, article in zip([0, 2, 5], cls.articles):
+            cls.comments[article.id] = [x.id for x in Comment.objects.bulk_create([
+                Comment(content=f"content..{i}", article=article, author=cls.test_user) for i in range(count)
+            ])]
+
+    def setUp(self):
+        super().setUp()
+        # load the session and user into their caches
+        self.client.get("/api/article/", {"limit": 1})
+
+    def test_article_with_comments(self):
+        article = self.articles[2]
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/api/article/{article.id}/", {"include": "comments", "comments_limit": 3})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['title'], article.title)
+        self.assertEqual([x['id'] for x in data['comments']], self.comments[article.id][:3])
+        self.assertEqual(data['comments_next'], self.comments[article.id][2])
+
+        url = f"/api/article/{article.id}/comment/"
+        rest = self.client.get(url, {"after": data['comments_next'], "limit": 10}).json()
+        self.assertEqual([x['id'] for x in rest['results']], self.comments[article.id][3:])
+        self.assertIsNone(rest['next'])
+
+        data = self.client.get(f"/api/article/{article.id}/", {"include": "comments"}).json()
+        self.assertEqual(len(data['comments']), 5)
+        self.assertIsNone(data['comments_next'])
+        self.assertEqual(self.client.get("/api/article/9999/", {"include": "comments"}).status_code, 404)
+
+    def test_list_with_comments(self):
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/article/", {"include": "comments", "comments_limit": 1, "limit": 10})
+        results = response.json()['results']
+        self.assertEqual([x['id'] for x in results], [x.id for x in self.articles])
+        self.assertEqual([[c['id'] for c in x['comments']] for x in results],
+                         [self.comments[x.id][:1] for x in self.articles])
+        self.assertEqual([x['comments_next'] for x in results],
+                         [None, self.comments[self.articles[1].id][0], self.comments[self.articles[2].id][0]])
+
+        plain = self.client.get("/api/article/", {"include": "comments", "comments_limit": 2}).json()
+        self.assertEqual([len(x['comments']) for x in plain], [0, 2, 2])
+        self.assertEqual([x['comments_next'] for x in plain][:2], [None, None])
+
+    def test_list_with_comments_at_unpaginated_cap(self):
+        Article.objects.bulk_create([
+            Article(title=f"title..{i}", content=f"content..{i}", author=self.test_user)
+            for i in range(settings.BLOG_UNPAGINATED_MAX)
+        ])
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/article/", {"include": "comments", "comments_limit": 1})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data), settings.BLOG_UNPAGINATED_MAX)
+        self.assertEqual([[c['id'] for c in x['comments']] for x in data[:3]],
+                         [self.comments[x.id][:1] for x in self.articles])
+        self.assertEqual(sum(len(x['comments']) for x in data), 2)
+
+    def test_batch_with_comments(self):
+        ids = f"{self.articles[2].id},9999,{self.articles[1].id}"
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/article/", {"ids": ids, "include": "comments"})
+        data = response.json()
+        self.assertEqual(data[1], {"id": 9999, "missing": True})
+        self.assertEqual([x['id'] for x in data[0]['comments']], self.comments[self.articles[2].id])
+        self.assertEqual([x['id'] for x in data[2]['comments']], self.comments[self.articles[1].id])
+
+    def test_comment_edit_changes_etag(self):
+        article = self.articles[1]
+        for url, params in [(f"/api/article/{article.id}/", {"include": "comments"}),
+                            ("/api/article/", {"include": "comments", "limit": 10})]:
+            with self.subTest(url=url):
+                etag = self.client.get(url, params)['ETag']
+                self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+                self.client.put(f"/api/comment/{self.comments[article.id][0]}/", data={"content": url},
+                                content_type="application/json")
+                response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(url, response.content.decode())
+
+    def test_rejects_include(self):
+        for url, params in [("/api/article/", {"include": "author"}),
+                            ("/api/article/", {"include": "comments", "stream": "1"}),
+                            ("/api/article/", {"include": "comments", "comments_limit": "0"}),
+                            (f"/api/article/{self.articles[0].id}/", {"include": "x"}),
+                            (f"/api/article/{self.articles[0].id}/comment/", {"after": "x"}),
+                            (f"/api/article/{self.articles[0].id}/comment/", {"after": "99999999999999999999"}),
+                            (f"/api/article/{self.articles[0].id}/comment/", {"after": "99999999999999999999", "stream": "1"})]:
+            with self.subTest(url=url, params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+
+    def test_paginate_comments(self):
+        article = self.articles[2]
+        url = f"/api/article/{article.id}/comment/"
+        first = self.client.get(url, {"limit": 2}).json()
+        self.assertEqual([x['id'] for x in first['results']], self.comments[article.id][:2])
+        self.assertEqual(first['next'], self.comments[article.id][1])
+        self.assertEqual(self.client.get(f"/api/article/{self.articles[0].id}/comment/", {"limit": 2}).json(),
+                         {"results": [], "next": None})
+        self.assertEqual(self.client.get("/api/article/9999/comment/", {"limit": 2}).status_code, 404)
+        self.assertEqual(self.client.get("/api/article/9999/comment/").status_code, 404)
+
+
+@override_settings(BLOG_CHANGES_SETTLE_SECONDS=0)
+class ChangesTestCase(LoggedInTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.article = Article.objects.create(title="title", content="content", author=cls.test_user)
+        cls.comment = Comment.objects.create(content="content", article=cls.article, author=cls.test_user)
+
+    def changes(self, since=None, **params):
+        if since is not None:
+            params['since'] = since
+        response = self.client.get("/api/changes/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def sync(self, since=None, limit=100):
+        seen = []
+        while True:
+            page = self.changes(since, limit=limit)
+            seen += [(x['type'], x['op'], x['id']) for x in page['changes']]
+            since = page['next']
+            if not page['more']:
+                return seen, since
+
+    def test_changes(self):
+        seen, cursor = self.sync()
+        self.assertEqual(seen, [("article", "created", self.article.id), ("comment", "created", self.comment.id)])
+        self.assertEqual(self.changes(cursor), {"changes": [], "next": cursor, "more": False})
+
+        url = f"/api/article/{self.article.id}/"
+        self.client.put(url, data={"title": "new", "content": "new"}, content_type="application/json")
+        data = self.changes(cursor)['changes']
+        self.assertEqual(data, [{"type": "article", "op": "updated", "id": self.article.id, "data": {
+            "id": self.article.id, "title": "new", "content": "new", "author": self.test_user.id, "comment_count": 0}}])
+        cursor = self.changes(cursor)['next']
+
+        new_id = self.client.post(url + "comment/", data={"content": "x"}, content_type="application/json").json()['id']
+        self.client.delete(f"/api/comment/{self.comment.id}/")
+        seen, cursor = self.sync(cursor)
+        self.assertEqual(sorted(seen), sorted([
+            ("article", "updated", self.article.id), ("comment", "created", new_id),
+            ("comment", "deleted", self.comment.id),
+        ]))
+
+        self.client.delete(url)
+        seen, cursor = self.sync(cursor)
+        self.assertEqual(seen, [("article", "deleted", self.article.id), ("comment", "deleted", new_id)])
+
+    def test_changes_pages_through_ties(self):
+        Article.objects.bulk_create([Article(title="x", content="x", author=self.test_user) for _ in range(5)])
+        Comment.objects.bulk_create([Comment(content="x", article=self.article, author=self.test_user) for _ in range(5)])
+        now = Article.objects.latest('id').updated_at
+        Article.objects.update(updated_at=now)
+        Comment.objects.update(updated_at=now)
+        seen, _ = self.sync(limit=3)
+        self.assertEqual(len(seen), 12)
+        self.assertEqual(len(set(seen)), 12)
+        self.assertEqual([x[0] for x in seen], ["article"] * 6 + ["comment"] * 6)
+
+    @override_settings(BLOG_CHANGES_SETTLE_SECONDS=60)
+    def test_changes_hold_back_recent_rows(self):
+        self.assertEqual(self.changes()['changes'], [])
+
+    def test_changes_rejects_cursor(self):
+        for since in ["x", "1.2", "1.9.1", "1.0.1.1", "99999999999999999999.0.0", "-99999999999999999.0.0",
+                      "0.0.99999999999999999999"]:
+            with self.subTest(since=since):
+                self.assertEqual(self.client.get("/api/changes/", {"since": since}).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get("/api/changes/").status_code, 401)
+
+
+@skipUnless(connection.vendor == 'sqlite', "SQLite only")
+class SearchTestCase(LoggedInTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.in_title = Article.objects.create(title="sourdough starter", content="flour and water", author=cls.test_user)
+        cls.in_content = Article.objects.create(title="bread", content="feeding a sourdough starter", author=cls.test_user)
+        cls.in_comment = Article.objects.create(title="pizza", content="dough", author=cls.test_user)
+        cls.unrelated = Article.objects.create(title="coffee", content="espresso", author=cls.test_user)
+        Comment.objects.create(content="I use sourdough too, with rye and spelt and a long cold proof overnight", article=cls.in_comment, author=cls.test_user)
+
+    def search(self, q, **params):
+        response = self.client.get("/api/article/search/", dict(params, q=q))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_search_ranks_articles(self):
+        results = self.search("sourdough")['results']
+        self.assertEqual([x['id'] for x in results], [self.in_title.id, self.in_content.id, self.in_comment.id])
+        self.assertEqual(results[0]['title'], "sourdough starter")
+        self.assertEqual(self.search("sourdough starter")['results'][0]['id'], self.in_title.id)
+        self.assertEqual(self.search("missing")['results'], [])
+        self.assertEqual(self.search('"sourdough" OR coffee*')['results'], [])
+
+    def test_search_pagination(self):
+        first = self.search("sourdough", limit=2)
+        self.assertEqual(len(first['results']), 2)
+        self.assertEqual(first['next'], 2)
+        second = self.search("sourdough", limit=2, offset=first['next'])
+        self.assertEqual([x['id'] for x in second['results']], [self.in_comment.id])
+        self.assertIsNone(second['next'])
+
+    def test_search_follows_writes(self):
+        url = f"/api/article/{self.unrelated.id}/"
+        self.client.put(url, data={"title": "coffee", "content": "sourdough coffee cake"}, content_type="application/json")
+        self.assertIn(self.unrelated.id, [x['id'] for x in self.search("sourdough")['results']])
+        comment = Comment.objects.get(article=self.in_comment)
+        self.client.delete(f"/api/comment/{comment.id}/")
+        self.client.delete(f"/api/article/{self.in_title.id}/")
+        self.assertCountEqual([x['id'] for x in self.search("sourdough")['results']], [self.in_content.id, self.unrelated.id])
+        self.client.post(f"/api/article/{self.in_comment.id}/comment/bulk/", data=[{"content": "more sourdough"}],
+                         content_type="application/json")
+        self.assertIn(self.in_comment.id, [x['id'] for x in self.search("sourdough")['results']])
+
+    def test_search_rejects_query(self):
+        for params in [{}, {"q": " "}, {"q": "x" * 257}, {"q": "x", "offset": "-1"}, {"q": "x", "limit": "0"},
+                       {"q": "x", "offset": "99999999999999999999"}]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get("/api/article/search/", params).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get("/api/article/search/", {"q": "x"}).status_code, 401)
+
+    def test_reindex_search(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM blog_search")
+        self.assertEqual(self.search("sourdough")['results'], [])
+        out = StringIO()
+        call_command("reindex_search", batch_size=2, stdout=out)
+        self.assertIn("Indexed 5 documents.", out.getvalue())
+        self.assertEqual(len(self.search("sourdough")['results']), 3)
+
+    def test_failed_reindex_keeps_index(self):
+        # Fails after the articles were re-inserted, before the comments.
+        with mock.patch("blog.search.Max", side_effect=[Max('id'), DatabaseError("interrupted")]), \
+                self.assertRaises(DatabaseError):
+            call_command("reindex_search", batch_size=2, stdout=StringIO())
+        self.assertEqual(len(self.search("sourdough")['results']), 3)
+
+
+@skipUnless(connection.vendor == 'sqlite', "SQLite only")
+class SQLiteTuningTestCase(TestCase):
+
+    def test_pragmas_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], settings.BLOG_SQLITE_PRAGMAS['busy_timeout'])
+
+    def open_connection(self, path, pragmas):
+        db = sqlite3.connect(path, timeout=0, isolation_level=None)
+        self.addCleanup(db.close)
+        apply_sqlite_pragmas(db, pragmas)
+        return db
+
+    def read_during_write(self, pragmas):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "db.sqlite3")
+            writer = self.open_connection(path, pragmas)
+            writer.execute("CREATE TABLE t (x INTEGER)")
+            writer.execute("INSERT INTO t VALUES (1)")
+            reader = self.open_connection(path, dict(pragmas, busy_timeout=0))
+            writer.execute("BEGIN EXCLUSIVE")
+            writer.execute("INSERT INTO t VALUES (2)")
+            try:
+                return reader.execute("SELECT count(*) FROM t").fetchone()[0]
+            finally:
+                writer.execute("COMMIT")
+                reader.close()
+                writer.close()
+
+    def test_readers_do_not_block_behind_writer(self):
+        with self.assertRaises(sqlite3.OperationalError):
+            self.read_during_write({'journal_mode': 'DELETE'})
+        # The reader sees the last committed snapshot instead of waiting.
+        self.assertEqual(self.read_during_write(settings.BLOG_SQLITE_PRAGMAS), 1)
+
+    def write_during_write(self, backend):
+        # A transaction that reads and then writes, begun while another writer
+        # holds the lock. Returns the rows it saw.
+        with tempfile.TemporaryDirectory() as tmp:
+            settings_dict = dict(connection.settings_dict, NAME=os.path.join(tmp, "db.sqlite3"))
+            writer = backend.DatabaseWrapper(settings_dict)
+            result = {}
+            started = threading.Event()
+
+            def read_then_write():
+                db = backend.DatabaseWrapper(settings_dict)
+                try:
+                    started.set()
+                    db.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+                    with db.cursor() as cursor:
+                        cursor.execute("SELECT count(*) FROM t")
+                        result['seen'] = cursor.fetchone()[0]
+                        cursor.execute("INSERT INTO t VALUES (3)")
+                    db.commit()
+                except Exception as e:
+                    result['error'] = e
+                finally:
+                    db.close()
+
+            try:
+                with writer.cursor() as cursor:
+                    cursor.execute("CREATE TABLE t (x INTEGER)")
+                    cursor.execute("INSERT INTO t VALUES (1)")
+                writer.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+                with writer.cursor() as cursor:
+                    cursor.execute("INSERT INTO t VALUES (2)")
+                thread = threading.Thread(target=read_then_write)
+                thread.start()
+                started.wait()
+                time.sleep(0.2)
+                writer.commit()
+                thread.join()
+            finally:
+                writer.close()
+        if 'error' in result:
+            raise result['error']
+        return result['seen']
+
+    def test_writers_wait_for_writer(self):
+        # A deferred BEGIN reads a snapshot the other writer's commit makes
+        # stale, so its write fails without waiting out busy_timeout.
+        with self.assertRaisesRegex(OperationalError, "database is locked"):
+            self.write_during_write(sqlite3_backend)
+        self.assertEqual(self.write_during_write(blog_sqlite3_backend), 2)
+
+
+class WriteQueueTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.test_user = User.objects.create_user(
+            username="testuser",
+            password="password"
+        )
+        self.queue = WriteQueue(max_batch=50)
+        self.addCleanup(self.queue.stop)
+
+    def create_article(self, title):
+        return Article.objects.create(title=title, content="content", author=self.test_user)
+
+    def test_group_commit(self):
+        started, release = threading.Event(), threading.Event()
+
+        def block():
+            started.set()
+            release.wait()
+
+        with mock.patch.object(self.queue, "commit", wraps=self.queue.commit) as commit:
+            first = self.queue.submit(block)
+            started.wait()
+            futures = [self.queue.submit(self.create_article, f"title..{i}") for i in range(10)]
+            release.set()
+            first.result()
+            articles = [future.result() for future in futures]
+        self.assertEqual([len(call.args[0]) for call in commit.call_args_list], [1, 10])
+        self.assertEqual([article.title for article in articles], [f"title..{i}" for i in range(10)])
+        self.assertEqual(Article.objects.count(), 10)
+
+    def test_failed_job_is_isolated(self):
+        def fail():
+            self.create_article("rolled back")
+            raise ValueError("job failed")
+
+        futures = [self.queue.submit(fail), self.queue.submit(self.create_article, "kept")]
+        with self.assertRaises(ValueError):
+            futures[0].result()
+        self.assertEqual(futures[1].result().title, "kept")
+        self.assertEqual(list(Article.objects.values_list("title", flat=True)), ["kept"])
+
+    @override_settings(BLOG_WRITE_QUEUE=True)
+    def test_views_write_through_queue(self):
+        self.addCleanup(get_write_queue().stop)
+        statuses = []
+        clients = []
+        for i in range(8):
+            # Log in up front: the in-memory test database locks whole tables
+            # under concurrent writes, so only the writer thread writes below.
+            clients.append(Client())
+            clients[-1].force_login(self.test_user)
+
+        def post(i):
+            response = clients[i].post("/api/article/", data={"title": f"title..{i}", "content": "content"},
+                                   content_type="application/json")
+            statuses.append((response.status_code, response.json()['title']))
+            connection.close()
+
+        threads = [threading.Thread(target=post, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(statuses), sorted((201, f"title..{i}") for i in range(8)))
+        self.assertEqual(Article.objects.count(), 8)
+        self.assertEqual(get_write_queue().thread.name, "blog-writer")
+
+
+@override_settings(BLOG_READ_REPLICAS=['replica'])
+class ReplicaRoutingTestCase(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.test_user = User.objects.create_user(
+            username="testuser",
+            password="password"
+        )
+        self.article = Article.objects.create(
+            title="primary title",
+            content="primary content",
+            author=self.test_user
+        )
+        # The replica is a second SQLite database that lags behind the primary.
+        User.objects.using('replica').create(id=self.test_user.id, username="testuser")
+        Article.objects.using('replica').create(
+            id=self.article.id,
+            title="replica title",
+            content="replica content",
+            author_id=self.test_user.id
+        )
+        self.client.force_login(self.test_user)
+        self.url = f"/api/article/?ids={self.article.id}"
+
+    def test_router(self):
+        router = PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(Article), 'replica')
+        self.assertIsNone(router.db_for_read(User))
+        self.assertEqual(router.db_for_write(Article), 'default')
+        token = use_primary.set(True)
+        try:
+            self.assertIsNone(router.db_for_read(Article))
+        finally:
+            use_primary.reset(token)
+        with override_settings(BLOG_READ_REPLICAS=[]):
+            self.assertIsNone(router.db_for_read(Article))
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.client.get(self.url).json()[0]['title'], "replica title")
+        response = self.client.get("/api/article/?stream=1")
+        self.assertEqual(json.loads(b"".join(response.streaming_content))[0]['title'], "replica title")
+
+    def test_read_your_writes(self):
+        response = self.client.put(
+            f"/api/article/{self.article.id}/",
+            data={"title": "written title", "content": "written content"},
+            content_type="application/json"
+        )
+        # The PUT read the article it updated from the primary.
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Article.objects.using('default').get(id=self.article.id).title, "written title")
+        self.assertEqual(self.client.get(self.url).json()[0]['title'], "written title")
+
+        with override_settings(BLOG_REPLICA_STICKY_SECONDS=0):
+            self.client.put(
+                f"/api/article/{self.article.id}/",
+                data={"title": "written title", "content": "written content"},
+                content_type="application/json"
+            )
+        self.assertEqual(self.client.get(self.url).json()[0]['title'], "replica title")
+
+    def test_cached_reads_see_writes(self):
+        detail_url = f"/api/article/{self.article.id}/"
+        comments_url = f"/api/article/{self.article.id}/comment/"
+        other = Client()
+        other.force_login(self.test_user)
+        self.assertEqual(self.client.get(detail_url).json()['title'], "replica title")
+        self.assertEqual(self.client.get(comments_url).json(), [])
+
+        self.client.put(detail_url, data={"title": "written title", "content": "written content"},
+                        content_type="application/json")
+        self.client.post(comments_url, data={"content": "written comment"}, content_type="application/json")
+        # A client outside the sticky window reads the lagging replica...
+        self.assertEqual(other.get(detail_url).json()['title'], "replica title")
+        self.assertEqual(other.get(comments_url).json(), [])
+        # ...without caching it for the writer.
+        self.assertEqual(self.client.get(detail_url).json()['title'], "written title")
+        self.assertEqual([c['content'] for c in self.client.get(comments_url).json()], ["written comment"])
+        # Primary reads are cached and served to everyone.
+        self.assertEqual(other.get(detail_url).json()['title'], "written title")
+        self.assertEqual([c['content'] for c in other.get(comments_url).json()], ["written comment"])
+
+    def test_replica_reads_have_no_etag(self):
+        comment = Comment.objects.create(content="content", article=self.article, author=self.test_user)
+        Comment.objects.using('replica').create(id=comment.id, content="content", article_id=self.article.id,
+                                                author_id=self.test_user.id)
+        other = Client()
+        other.force_login(self.test_user)
+        self.client.put(f"/api/article/{self.article.id}/", data={"title": "written title", "content": "c"},
+                        content_type="application/json")
+        for url in [f"/api/article/{self.article.id}/", f"/api/article/{self.article.id}/comment/",
+                    f"/api/comment/{comment.id}/", self.url]:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+                # The replica may not have the version the tag names.
+                response = other.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn('ETag', response)
+
+
+@override_settings(ROOT_URLCONF='myblog.async_urls')
+class AsyncReplicaRoutingTestCase(ReplicaRoutingTestCase):
+    pass
+
+
+@override_settings(ROOT_URLCONF='myblog.async_urls')
+class AsyncBlogTestCase(BlogTestCase):
+    pass
+
+
+@override_settings(ROOT_URLCONF='myblog.async_urls')
+class AsyncQueryCountTestCase(QueryCountTestCase):
+    pass
+
+
+@override_settings(ROOT_URLCONF='myblog.async_urls')
+class AsyncConditionalGetTestCase(ConditionalGetTestCase):
+
+    def test_cache_stays_off_the_event_loop(self):
+        cache = caches[settings.BLOG_CACHE_ALIAS]
+        on_loop = []
+
+        def check(method):
+            def wrapper(*args, **kwargs):
+                try:
+                    asyncio.get_running_loop()
+                    on_loop.append(method.__name__)
+                except RuntimeError:
+                    pass
+                return method(*args, **kwargs)
+            return wrapper
+
+        with mock.patch.object(cache, "get", check(cache.get)), mock.patch.object(cache, "set", check(cache.set)), \
+                mock.patch.object(cache, "add", check(cache.add)):
+            for url in [f"/api/article/{self.article.id}/", f"/api/article/{self.article.id}/comment/",
+                        f"/api/comment/{self.comment.id}/", "/api/article/"]:
+                for _ in range(2):
+                    self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(on_loop, [])
+
+
+@override_settings(ROOT_URLCONF='myblog.async_urls')
+class AsyncCommentListCacheTestCase(CommentListCacheTestCase):
+    pass
+
+
+@override_settings(ROOT_URLCONF='myblog.async_urls')
+class AsyncCommentCountTestCase(CommentCountTestCase):
+    pass
+
+
+@override_settings(ROOT_URLCONF='myblog.async_urls')
+class AsyncEmbeddedCommentsTestCase(EmbeddedCommentsTestCase):
+    pass
+
+
+class ASGIHandlerTestCase(LoggedInTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Article.objects.bulk_create([
+            Article(title=f"title..{i}", content=f"content..{i}", author=cls.test_user)
+            for i in range(25)
+        ])
+
+    def asgi_get(self, path, query_string=""):
+        self.client.force_login(self.test_user)
+        cookie = f"sessionid={self.client.cookies['sessionid'].value}"
+        return async_to_sync(asgi_request)(BlogASGIHandler(), "GET", path, query_string, [(b"cookie", cookie.encode())])
+
+    @override_settings(BLOG_STREAM_CHUNK_SIZE=10)
+    def test_streaming_response_under_asgi(self):
+        for urlconf in ['myblog.urls', 'myblog.async_urls']:
+            with self.subTest(urlconf=urlconf), override_settings(ROOT_URLCONF=urlconf):
+                messages = self.asgi_get("/api/article/", "stream=1")
+                self.assertEqual(response_status(messages), 200)
+                self.assertEqual(len(json.loads(response_body(messages))), 25)
+                self.assertGreater(len(messages), 4)
+
+
+@override_settings(ROOT_URLCONF='myblog.async_urls')
+class CommentStreamTestCase(LoggedInTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.article = Article.objects.create(title="title", content="content", author=cls.test_user)
+
+    def setUp(self):
+        super().setUp()
+        self.cookie = (b"cookie", f"sessionid={self.client.cookies['sessionid'].value}".encode())
+        self.url = f"/api/article/{self.article.id}/comment/stream/"
+        self.application = BlogASGIHandler()
+
+    def write(self, method, url, data=None):
+        # Publishing waits for the commit, which TestCase never makes.
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(url, data=data, content_type="application/json")
+        return response.json() if response.content else None
+
+    def stream(self, scenario, headers=(), expect=0, disconnect=True):
+        # Opens the stream, runs scenario, waits for `expect` events and then
+        # disconnects. Returns the status and the parsed events.
+        async def run():
+            messages = []
+            disconnected = asyncio.Event()
+            requested = False
+
+            async def receive():
+                nonlocal requested
+                if not requested:
+                    requested = True
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                messages.append(message)
+
+            async def wait_for(condition):
+                for _ in range(200):
+                    if condition():
+                        return
+                    await asyncio.sleep(0.01)
+                self.fail("timed out waiting for the stream")
+
+            scope = asgi_scope("GET", self.url, "", [self.cookie, *headers])
+            task = asyncio.ensure_future(self.application(scope, receive, send))
+            await wait_for(lambda: len(messages) > 1 or task.done())
+            if response_status(messages) == 200:
+                await scenario()
+                # every event follows the retry line
+                await wait_for(lambda: response_body(messages).count(b"\nid: ") >= expect)
+                if disconnect:
+                    disconnected.set()
+            await asyncio.wait_for(task, 2)
+            return messages
+
+        messages = async_to_sync(run)()
+        events = []
+        for block in response_body(messages).decode().split("\n\n"):
+            fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+            if "data" in fields:
+                events.append((fields["id"], json.loads(fields["data"])))
+        return response_status(messages), events
+
+    def test_live_events(self):
+        comment = {}
+
+        async def scenario():
+            comment.update(await sync_to_async(self.write)(
+                "post", f"/api/article/{self.article.id}/comment/", {"content": "first"}))
+            await sync_to_async(self.write)("put", f"/api/comment/{comment['id']}/", {"content": "edited"})
+            await sync_to_async(self.write)("delete", f"/api/comment/{comment['id']}/")
+
+        status, events = self.stream(scenario, expect=3)
+        self.assertEqual(status, 200)
+        self.assertEqual([(x['op'], x['id']) for _, x in events],
+                         [("created", comment['id']), ("updated", comment['id']), ("deleted", comment['id'])])
+        self.assertEqual(events[1][1]['data']['content'], "edited")
+        cursors = [decode_cursor(id) for id, _ in events]
+        self.assertEqual(cursors, sorted(cursors))
+        self.assertEqual(get_broker().subscriptions, {})
+
+    def test_resume_replays_from_database(self):
+        url = f"/api/article/{self.article.id}/comment/"
+        first = self.write("post", url, {"content": "first"})
+        second = self.write("post", url, {"content": "second"})
+        self.write("delete", f"/api/comment/{first['id']}/")
+
+        async def scenario():
+            pass
+
+        _, events = self.stream(scenario)
+        self.assertEqual(events, [])
+        # The database only holds the latest state of each comment.
+        status, events = self.stream(scenario, expect=2, headers=[(b"last-event-id", b"0.0.0")])
+        self.assertEqual(status, 200)
+        self.assertEqual([(x['op'], x['id']) for _, x in events], [("created", second['id']), ("deleted", first['id'])])
+        _, replayed = self.stream(scenario, expect=1, headers=[(b"last-event-id", events[0][0].encode())])
+        self.assertEqual([(x['op'], x['id']) for _, x in replayed], [("deleted", first['id'])])
+
+    @override_settings(ROOT_URLCONF='myblog.urls')
+    def test_asgi_application_serves_stream(self):
+        async def scenario():
+            await sync_to_async(self.write)("post", f"/api/article/{self.article.id}/comment/", {"content": "first"})
+
+        messages = async_to_sync(asgi_request)(BlogASGIHandler(), "GET", self.url, "", [self.cookie])
+        self.assertEqual(response_status(messages), 404)
+        self.application = asgi_application
+        status, events = self.stream(scenario, expect=1)
+        self.assertEqual(status, 200)
+        self.assertEqual([x['op'] for _, x in events], ["created"])
+
+    def test_article_delete_ends_stream(self):
+        comment = self.write("post", f"/api/article/{self.article.id}/comment/", {"content": "first"})
+
+        async def scenario():
+            await sync_to_async(self.write)("delete", f"/api/article/{self.article.id}/")
+
+        status, events = self.stream(scenario, expect=1, disconnect=False)
+        self.assertEqual(status, 200)
+        self.assertEqual([(x['op'], x['id']) for _, x in events], [("deleted", comment['id'])])
+
+    @override_settings(BLOG_EVENT_QUEUE_SIZE=1)
+    def test_overflow_ends_stream(self):
+        async def scenario():
+            # Both are queued before the stream reads either, so the second
+            # one overflows.
+            for id in [1, 2]:
+                get_broker().publish(comment_topic(self.article.id), ((timezone.now(), 1, id), {"id": id}))
+
+        status, events = self.stream(scenario, expect=1, disconnect=False)
+        self.assertEqual([x for _, x in events], [{"id": 1}])
+
+    def test_rejects_stream(self):
+        async def scenario():
+            pass
+
+        for last_event_id in [b"x", b"99999999999999999999.0.0", b"0.0.99999999999999999999"]:
+            self.assertEqual(self.stream(scenario, headers=[(b"last-event-id", last_event_id)])[0], 400)
+        self.url = "/api/article/9999/comment/stream/"
+        self.assertEqual(self.stream(scenario)[0], 404)
+        self.cookie = (b"cookie", b"")
+        self.assertEqual(self.stream(scenario)[0], 401)
+        self.assertEqual(get_broker().subscriptions, {})
+
+
+@shared_caches
+class MetricsTestCase(LoggedInTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.article = Article.objects.create(title="title", content="content", author=cls.test_user)
+
+    def setUp(self):
+        super().setUp()
+        get_metrics().reset()
+
+    def metrics(self):
+        response = self.client.get("/api/metrics/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith("text/plain; version=0.0.4"))
+        return response.content.decode()
+
+    def test_metrics(self):
+        url = f"/api/article/{self.article.id}/"
+        body = self.client.get(url).content
+        self.client.get(url)
+        self.client.put(url, data={"title": "t", "content": "c"}, content_type="application/json")
+        self.client.get("/api/missing/")
+        metrics = self.metrics()
+        labels = 'view="article_retrieve_update_delete",method="GET"'
+        self.assertIn(f'blog_request_duration_seconds_count{{{labels}}} 2', metrics)
+        self.assertIn(f'blog_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2', metrics)
+        # user and article, then a read served from the caches
+        self.assertIn(f'blog_request_queries_sum{{{labels}}} 2', metrics)
+        self.assertIn(f'blog_request_queries_bucket{{{labels},le="0"}} 1', metrics)
+        self.assertIn(f'blog_response_size_bytes_sum{{{labels}}} {2 * len(body)}', metrics)
+        self.assertIn('blog_request_duration_seconds_count{view="article_retrieve_update_delete",method="PUT"} 1', metrics)
+        self.assertIn('blog_request_duration_seconds_count{view="unmatched",method="GET"} 1', metrics)
+        self.assertIn('# TYPE blog_request_query_duration_seconds_total counter', metrics)
+        self.assertIn('blog_request_duration_seconds_count{view="metrics",method="GET"} 1', self.metrics())
+
+    def test_streaming_response_size(self):
+        self.client.get("/api/article/", {"stream": "1"})
+        metrics = self.metrics()
+        self.assertIn('blog_request_duration_seconds_count{view="article_create_list",method="GET"} 1', metrics)
+        self.assertIn('blog_response_size_bytes_count{view="article_create_list",method="GET"} 0', metrics)
+
+    @override_settings(BLOG_METRICS_ALLOWED_IPS=['127.0.0.1', '10.1.0.0/16'])
+    def test_metrics_access(self):
+        self.assertEqual(self.client.get("/api/metrics/", REMOTE_ADDR="10.1.2.3").status_code, 200)
+        for remote_addr in ["10.2.0.1", "::1", ""]:
+            with self.subTest(remote_addr=remote_addr):
+                response = self.client.get("/api/metrics/", REMOTE_ADDR=remote_addr)
+                self.assertEqual(response.status_code, 403)
+                self.assertNotIn(b"blog_request", response.content)
+        self.client.logout()
+        self.assertEqual(self.client.get("/api/metrics/", REMOTE_ADDR="10.2.0.1").status_code, 403)
+        self.test_user.is_staff = True
+        self.test_user.save()
+        self.client.force_login(self.test_user)
+        self.assertEqual(self.client.get("/api/metrics/", REMOTE_ADDR="10.2.0.1").status_code, 200)
+
+
+@shared_caches
+class QueryDetectorTestCase(LoggedInTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.articles = Article.objects.bulk_create([
+            Article(title=f"title..{i}", content=f"content..{i}", author=cls.test_user) for i in range(100)
+        ])
+        for article in cls.articles[:20]:
+            Comment.objects.bulk_create([Comment(content="x", article=article, author=cls.test_user)] * 3)
+
+    def test_query_shape(self):
+        self.assertEqual(query_shape('SELECT * FROM "t" WHERE "id" IN (%s, %s, %s) AND x = %s'),
+                         'SELECT * FROM "t" WHERE "id" IN (...) AND x = %s')
+
+    def test_budget_catches_n_plus_one(self):
+        with self.assertRaisesRegex(QueryBudgetExceeded, r'100 x SELECT .*"auth_user"'):
+            with query_budget(1000):
+                [article.author.username for article in Article.objects.all()]
+        with self.assertRaisesRegex(QueryBudgetExceeded, "2 queries, budget is 1"):
+            with query_budget(1):
+                list(Article.objects.filter(id__in=[1, 2]))
+                list(Article.objects.filter(id__in=[3]))
+
+    def test_endpoint_budgets(self):
+        # Budgets include the session and user lookups of the logged-in client;
+        # none of them grows with the 100 articles in the fixture.
+        ids = ",".join(str(x.id) for x in self.articles)
+        article_id = self.articles[0].id
+        for budget, path, params in [
+            (4, "/api/article/", {"limit": 100, "include": "comments"}),
+            (4, "/api/article/", {"ids": ids, "include": "comments"}),
+            (3, "/api/article/", {"stream": "1"}),
+            (5, "/api/changes/", {"limit": 100}),
+            (3, "/api/article/search/", {"q": "title"}),
+            (3, f"/api/article/{article_id}/comment/", {"limit": 100}),
+        ]:
+            with self.subTest(path=path, params=params), query_budget(budget):
+                response = self.client.get(path, params)
+                self.assertEqual(response.status_code, 200)
+                if response.streaming:
+                    b"".join(response.streaming_content)
+
+    @override_settings(BLOG_QUERY_DETECTOR=True, BLOG_SLOW_QUERY_MS=0)
+    def test_middleware_logs_slow_queries(self):
+        client = Client()
+        client.force_login(self.test_user)
+        with self.assertLogs('blog.queries', 'WARNING') as logs:
+            client.get("/api/article/", {"limit": 1})
+        self.assertIn("slow query", logs.output[-1])
+        self.assertIn("GET /api/article/ (article_create_list)", logs.output[-1])
+        self.assertIn("blog/views.py", logs.output[-1])
+
+    @override_settings(BLOG_QUERY_DETECTOR=True)
+    def test_middleware_logs_repeated_queries(self):
+        client = Client()
+        client.force_login(self.test_user)
+        # The request user plus one author lookup per article.
+        with mock.patch("blog.views.serialize_article", lambda article: {"author": article.author.username}), \
+                self.assertLogs('blog.queries', 'WARNING') as logs:
+            client.get("/api/article/", {"limit": 10})
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("possible N+1 in GET /api/article/ (article_create_list): 11 x SELECT", logs.output[0])
+
+
+class BenchTestCase(TestCase):
+
+    def test_zipf_counts(self):
+        counts = list(zipf_counts(1000, 50, 1.2))
+        self.assertEqual(sum(counts), 1000)
+        self.assertTrue(all(a >= b - 1 for a, b in zip(counts, counts[1:])))
+        self.assertGreater(counts[0], 10 * counts[-1])
+
+    def test_seed_articles(self):
+        user = User.objects.create_user(username="testuser", password="password")
+        articles = seed_articles([user.id], 30, 200, batch_size=7)
+        self.assertEqual(articles.count(), 30)
+        self.assertEqual(Comment.objects.count(), 200)
+        for article in articles.annotate(actual=Count('comment')):
+            self.assertEqual(article.comment_count, article.actual)
+
+    def test_seed_blog_command(self):
+        out = StringIO()
+        call_command('seed_blog', users=3, articles=20, comments=150, batch_size=8, stdout=out)
+        self.assertIn("Created 3 users, 20 articles and 150 comments", out.getvalue())
+        self.assertEqual(Comment.objects.count(), 150)
+        self.assertLessEqual(set(Article.objects.values_list('author__username', flat=True)),
+                             {"user1", "user2", "user3"})
+        self.assertFalse(Article.objects.annotate(actual=Count('comment')).exclude(comment_count=F('actual')))
+        self.assertTrue(self.client.login(username="user2", password="password"))
+
+    def test_wsgi_request(self):
+        status, body = wsgi_request(WSGIHandler(), 'GET', '/api/article/', 'limit=1')
+        self.assertEqual(status, 401)
+        # The real handler checks CSRF, unlike the test client.
+        status, body = wsgi_request(WSGIHandler(), 'POST', '/api/signup/', '',
+                                    [(b"content-type", b"application/json")],
+                                    b'{"username": "a", "password": "b"}')
+        self.assertEqual(status, 403)
+        status, body = wsgi_request(WSGIHandler(), 'GET', '/api/token/')
+        self.assertEqual(status, 204)
+
+    def test_compare(self):
+        result = {"p50_ms": 2, "p95_ms": 6, "p99_ms": 8, "rps": 50, "queries_per_request": 2}
+        before = {"p50_ms": 2, "p95_ms": 4, "p99_ms": 8, "rps": 100, "queries_per_request": 1}
+        changes = compare({"targets": {"wsgi": {"GET a": result, "GET b": result}}},
+                          {"targets": {"wsgi": {"GET a": before}}})
+        self.assertEqual(changes, {"wsgi": {"GET a": {
+            "p50_change": 0.0, "p95_change": 0.5, "p99_change": 0.0, "rps_change": -0.5,
+            "queries_per_request": [1, 2],
+        }}})
+
+
+class ExportImportTestCase(LoggedInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        other = User.objects.create_user(username="other", password="password")
+        self.articles = [Article.objects.create(title=f"title..{i}", content="content", author=self.test_user)
+                         for i in range(5)]
+        for i in range(12):
+            create_comment(content=f"comment..{i}", article=self.articles[i % 3], author=[self.test_user, other][i % 2])
+
+    def path(self, name):
+        return os.path.join(self.dir.name, name)
+
+    def snapshot(self):
+        return (list(Article.objects.order_by('id').values('id', 'title', 'content', 'author__username',
+                                                          'comment_count', 'created_at', 'updated_at')),
+                list(Comment.objects.order_by('id').values('id', 'content', 'article', 'author__username',
+                                                          'created_at', 'updated_at')))
+
+    def export_and_import(self, name, **options):
+        out = StringIO()
+        call_command('export_blog', self.path(name), batch_size=4, stdout=out, **options)
+        self.assertEqual(out.getvalue(), "Exported 17 rows.\n")
+        before = self.snapshot()
+        Article.objects.all().delete()
+        User.objects.filter(username="other").delete()
+        call_command('import_blog', self.path(name), batch_size=5, stdout=out)
+        self.assertIn("Imported 17 rows, skipped 0.", out.getvalue())
+        self.assertEqual(self.snapshot(), before)
+
+    def test_round_trip(self):
+        self.export_and_import("blog.ndjson")
+        with open(self.path("blog.ndjson")) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([line['type'] for line in lines], ["article"] * 5 + ["comment"] * 12)
+        self.assertEqual(lines[5]['author'], "testuser")
+        self.assertFalse(User.objects.get(username="other").has_usable_password())
+
+    def test_round_trip_gzip(self):
+        self.export_and_import("blog.ndjson.gz")
+        with open(self.path("blog.ndjson.gz"), 'rb') as f:
+            self.assertEqual(f.read(2), b"\x1f\x8b")
+
+    def test_export_resumes_from_checkpoint(self):
+        path, checkpoint = self.path("blog.ndjson.gz"), self.path("checkpoint.json")
+        call_command('export_blog', path, batch_size=4, stdout=StringIO())
+        with open(path, 'rb') as f:
+            expected = gzip.decompress(f.read())
+        # As if interrupted after the first batch of comments.
+        with open(path, 'rb') as f:
+            data = f.read()
+        offset = len(gzip.compress(b"x"))
+        with open(path, 'wb') as f:
+            f.write(gzip.compress(b"".join(expected.splitlines(keepends=True)[:9])) + data[:offset])
+        with open(checkpoint, 'w') as f:
+            json.dump({"type": "comment", "id": Comment.objects.order_by('id')[3].id,
+                       "offset": os.path.getsize(path) - offset}, f)
+        out = StringIO()
+        call_command('export_blog', path, batch_size=4, checkpoint=checkpoint, stdout=out)
+        self.assertEqual(out.getvalue(), "Exported 8 rows.\n")
+        with open(path, 'rb') as f:
+            self.assertEqual(gzip.decompress(f.read()), expected)
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_resumed_export_skips_comments_on_new_articles(self):
+        path, checkpoint = self.path("blog.ndjson"), self.path("checkpoint.json")
+        call_command('export_blog', path, stdout=StringIO())
+        with open(path, 'rb') as f:
+            expected = f.read()
+        with open(path, 'wb') as f:
+            f.write(b"".join(expected.splitlines(keepends=True)[:9]))
+        with open(checkpoint, 'w') as f:
+            json.dump({"type": "comment", "id": Comment.objects.order_by('id')[3].id,
+                       "offset": os.path.getsize(path), "articles": self.articles[-1].id}, f)
+        # Written between the runs: the first one never exported this article.
+        article = Article.objects.create(title="new", content="content", author=self.test_user)
+        create_comment(content="new", article=article, author=self.test_user)
+        out = StringIO()
+        call_command('export_blog', path, checkpoint=checkpoint, stdout=out)
+        self.assertEqual(out.getvalue(), "Exported 8 rows.\n")
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), expected)
+
+    def test_export_resume_needs_output(self):
+        path, checkpoint = self.path("blog.ndjson"), self.path("checkpoint.json")
+        with open(checkpoint, 'w') as f:
+            json.dump({"type": "comment", "id": 1, "offset": 100}, f)
+        with self.assertRaisesRegex(CommandError, "missing"):
+            call_command('export_blog', path, checkpoint=checkpoint, stdout=StringIO())
+        self.assertTrue(os.path.exists(checkpoint))
+
+    def test_import_resume(self):
+        path = self.path("blog.ndjson")
+        call_command('export_blog', path, stdout=StringIO())
+        Comment.objects.filter(id__gt=Comment.objects.order_by('id')[5].id).delete()
+        out = StringIO()
+        call_command('import_blog', path, resume=True, stdout=out)
+        self.assertEqual(out.getvalue(), "Imported 6 rows, skipped 11.\n")
+        self.assertEqual(Comment.objects.count(), 12)
+
+    def test_import_rejects_bad_lines(self):
+        path = self.path("blog.ndjson")
+        with open(path, 'w') as f:
+            f.write('{"type": "article", "id": 100, "title": "t", "content": "c", "author": "testuser", '
+                    '"comment_count": 0, "created_at": "2022-01-01T00:00:00+00:00", '
+                    '"updated_at": "2022-01-01T00:00:00+00:00"}\n{"type": "user", "id": 1}\n')
+        with self.assertRaisesRegex(CommandError, "Line 2"):
+            call_command('import_blog', path, stdout=StringIO())
+        with open(path, 'w') as f:
+            f.write('{"type": "article", "id": "7"}\n')
+        with self.assertRaisesRegex(CommandError, "Line 1"):
+            call_command('import_blog', path, stdout=StringIO())
+        with open(path, 'w') as f:
+            f.write('{"type": "comment", "id": 100, "author": "testuser", "article": 1, '
+                    '"created_at": "2022-01-01T00:00:00+00:00", "updated_at": "2022-01-01T00:00:00+00:00"}\n')
+        with self.assertRaisesRegex(CommandError, "Batch of comments ending at line 1"):
+            call_command('import_blog', path, stdout=StringIO())
+
+
+@shared_caches
+class CachedAuthenticationTestCase(LoggedInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.post("/api/signin/", data={"username": "testuser", "password": "password"},
+                         content_type="application/json")
+        self.client.get("/api/article/")
+
+    def test_authenticated_read_skips_session_and_user(self):
+        # articles only
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/article/")
+        self.assertEqual(response.status_code, 200)
 
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')
+    def test_logout_revokes_without_session_cache(self):
+        other = Client()
+        other.cookies['sessionid'] = self.client.cookies['sessionid'].value
+        self.assertEqual(other.get("/api/article/").status_code, 200)
+        self.assertEqual(self.client.get("/api/signout/").status_code, 204)
+        self.assertEqual(other.get("/api/article/").status_code, 401)
+
+    def test_logout_revokes(self):
+        # A second client replaying the same session cookie after logout.
+        other = Client()
+        other.cookies['sessionid'] = self.client.cookies['sessionid'].value
+        self.assertEqual(other.get("/api/article/").status_code, 200)
+        self.assertEqual(self.client.get("/api/signout/").status_code, 204)
+        self.assertEqual(other.get("/api/article/").status_code, 401)
+
+    def test_password_change_revokes(self):
+        user = User.objects.get(id=self.test_user.id)
+        user.set_password("changed")
+        user.save()
+        self.assertEqual(self.client.get("/api/article/").status_code, 401)
+
+    def test_deactivation_revokes(self):
+        User.objects.filter(id=self.test_user.id).update(is_active=False)
+        # update() sends no signals; the entry lives out its TTL
+        self.assertEqual(self.client.get("/api/article/").status_code, 200)
+        User.objects.get(id=self.test_user.id).save()
+        self.assertEqual(self.client.get("/api/article/").status_code, 401)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db', BLOG_AUTH_CACHE_TIMEOUT=0)
+    def test_password_change_elsewhere_revokes_without_user_cache(self):
+        # As saved by another worker: this process's version counter is not bumped.
+        User.objects.filter(id=self.test_user.id).update(password=make_password("changed"))
+        self.assertEqual(self.client.get("/api/article/").status_code, 401)
+
+    @override_settings(BLOG_AUTH_CACHE_TIMEOUT=0)
+    def test_cache_disabled(self):
+        caches['blog_auth'].clear()
+        self.client.get("/api/article/")
+        # user, articles
+        with self.assertNumQueries(2):
+            self.client.get("/api/article/")
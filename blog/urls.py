@@ -1,13 +1,33 @@
-from django.urls import path
+from django.urls import path, register_converter
+from django.urls.converters import IntConverter
 from blog import views
 
-urlpatterns = [
-    path('signup/', views.signup, name='signup'),
-    path('signin/', views.signin, name='signin'),
-    path('signout/', views.signout, name='signout'),
-    path('article/', views.ArticleCreateListView.as_view(), name='article_create_list'),
-    path('article/<int:id>/', views.ArticleRetUptDelView.as_view(), name='article_retrieve_update_delete'),
-    path('article/<int:id>/comment/', views.CommentCreateListView.as_view(), name='comment_create_list'),
-    path('comment/<int:id>/', views.CommentRetUptDelView.as_view(), name='comment_retrieve_update_delete'),
-    path('token/', views.token, name='token'),
-]
+
+class IdConverter(IntConverter):
+    # Ids SQLite can't bind don't match, so they 404 instead of overflowing.
+
+    def to_python(self, value):
+        return views.parse_int(value)
+
+
+register_converter(IdConverter, 'id')
+
+
+def build_urlpatterns(crud_views):
+    return [
+        path('signup/', views.signup, name='signup'),
+        path('signin/', views.signin, name='signin'),
+        path('signout/', views.signout, name='signout'),
+        path('article/', crud_views.ArticleCreateListView.as_view(), name='article_create_list'),
+        path('article/bulk/', views.ArticleBulkCreateView.as_view(), name='article_bulk_create'),
+        path('article/search/', views.ArticleSearchView.as_view(), name='article_search'),
+        path('article/<id:id>/', crud_views.ArticleRetUptDelView.as_view(), name='article_retrieve_update_delete'),
+        path('article/<id:id>/comment/', crud_views.CommentCreateListView.as_view(), name='comment_create_list'),
+        path('article/<id:id>/comment/bulk/', views.CommentBulkCreateView.as_view(), name='comment_bulk_create'),
+        path('comment/<id:id>/', crud_views.CommentRetUptDelView.as_view(), name='comment_retrieve_update_delete'),
+        path('changes/', views.ChangesView.as_view(), name='changes'),
+        path('metrics/', views.metrics, name='metrics'),
+        path('token/', views.token, name='token'),
+    ]
+
+urlpatterns = build_urlpatterns(views)
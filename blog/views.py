@@ -1,15 +1,36 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery
 from django.views import View
 from django.views.decorators.csrf import ensure_csrf_cookie
 
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 
-from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, JsonResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import parse_etags, quote_etag
 
+from datetime import timedelta
+import hashlib
+from ipaddress import ip_address, ip_network
+from itertools import chain
 import json
 from json.decoder import JSONDecodeError
 
-from blog.models import Article, User, Comment
+from blog.caching import (
+    bump_version, cache_article, cache_comment_list, get_cached_article, get_cached_comment_list, get_version, invalidate,
+    invalidate_article, invalidate_comment_list,
+)
+from blog.changes import COMMENT_SOURCE, TOMBSTONE_SOURCE, change_cursor, decode_cursor, encode_cursor, get_changes
+from blog.events import CLOSE, comment_topic, publish
+from blog.metrics import get_metrics
+from blog.models import Article, User, Comment, Tombstone
+from blog.routers import reads_from_primary
+from blog.search import is_supported, search_articles
+from blog.writer import run_write
 
 def check_user_auth(request):
     if not request.user.is_authenticated:
@@ -22,6 +43,9 @@ def get_article(id):
     except Article.DoesNotExist:
         return None
     
+def article_exists(id):
+    return Article.objects.filter(id=id).exists()
+
 def get_comment(id):
     try:
         return Comment.objects.get(id=id)
@@ -29,51 +53,413 @@ def get_comment(id):
         return None
     
 def is_author(instance, request):
-    if instance.author != request.user:
+    if instance.author_id != request.user.id:
         return False
     return True
 
+class RequestBodyTooLarge(Exception):
+    pass
+
+def get_body(request, max_size=None):
+    # Decoded once per request and cached on it; the size check runs on the
+    # declared length before the body is read or decoded.
+    if not hasattr(request, '_json_body'):
+        max_size = max_size or settings.BLOG_MAX_BODY_SIZE
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if length > max_size:
+            raise RequestBodyTooLarge()
+        body = request.body
+        if len(body) > max_size:
+            raise RequestBodyTooLarge()
+        try:
+            request._json_body = json.loads(body)
+        except UnicodeDecodeError as e:
+            raise JSONDecodeError(str(e), '', 0)
+    return request._json_body
+
 def get_body_value(request, *args):
-    results = []
-    body = request.body.decode()
-    for arg in args:
-        results.append(json.loads(body)[arg])
-    return results
+    body = get_body(request)
+    if not isinstance(body, dict):
+        raise KeyError(args[0])
+    return [body[arg] for arg in args]
+
+def make_etag(request, name, *extra):
+    # Built from the version counter the signals bump on every write, so a
+    # match proves the payload is unchanged without rendering it. Responses
+    # that embed other objects add their version names as extra.
+    versions = [get_version(x) for x in (name, *extra)]
+    return versions[0], format_etag(request, name, versions)
+
+def format_etag(request, name, versions):
+    # No ETag for replica reads: the counters follow the primary, so a body
+    # from a lagging replica would be tagged, and then revalidated, as current.
+    if not reads_from_primary():
+        return None
+    tag = f"{name}-" + '-'.join(map(str, versions))
+    if request.GET:
+        tag += '-' + hashlib.md5(request.GET.urlencode().encode()).hexdigest()[:16]
+    return quote_etag(tag)
+
+def etag_matches(request, etag):
+    return etag is not None and etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+
+def set_etag(response, etag):
+    if etag is not None:
+        response['ETag'] = etag
+
+def not_modified(etag):
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    return response
+
+def get_flag_param(request, name):
+    return request.GET.get(name, '').lower() in ('1', 'true', 'yes')
+
+class InvalidBulkItem(Exception):
+
+    def __init__(self, index, error):
+        super().__init__(index, error)
+        self.index = index
+        self.error = error
+
+def get_bulk_items(request, build, args):
+    items = get_body(request, max_size=settings.BLOG_BULK_MAX_BODY_SIZE)
+    if not isinstance(items, list) or not 0 < len(items) <= settings.BLOG_BULK_MAX_ITEMS:
+        raise InvalidBulkItem(None, f"body must be a list of 1 to {settings.BLOG_BULK_MAX_ITEMS} items")
+    objs = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not all(isinstance(item.get(arg), str) for arg in args):
+            raise InvalidBulkItem(index, f"item must have string fields {', '.join(args)}")
+        obj = build(*[item[arg] for arg in args])
+        try:
+            obj.clean_fields(exclude=['author', 'article'])
+        except ValidationError as e:
+            raise InvalidBulkItem(index, e.message_dict)
+        objs.append(obj)
+    return objs
+
+def bulk_create_response(request, model, build, args, created):
+    try:
+        objs = get_bulk_items(request, build, args)
+    except RequestBodyTooLarge:
+        return HttpResponse(status=413)
+    except JSONDecodeError:
+        return HttpResponseBadRequest()
+    except InvalidBulkItem as e:
+        return JsonResponse({"index": e.index, "error": e.error}, status=400)
+
+    def insert():
+        with transaction.atomic():
+            inserted = model.objects.bulk_create(objs)
+            # bulk_create sends no post_save signals
+            created(inserted)
+        return inserted
+
+    objs = run_write(insert)
+    return JsonResponse([obj.id for obj in objs], status=201, safe=False)
+
+# Largest integer SQLite will bind; bigger ones raise OverflowError.
+MAX_INT = 2 ** 63 - 1
+
+def parse_int(value):
+    value = int(value)
+    if not -MAX_INT - 1 <= value <= MAX_INT:
+        raise ValueError(f"{value} is out of range")
+    return value
+
+def get_int_param(request, name, minimum=0):
+    value = request.GET.get(name)
+    if value is None:
+        return None
+    value = parse_int(value)
+    if value < minimum:
+        raise ValueError(f"{name} must be >= {minimum}")
+    return value
+
+def get_id_list_param(request, name, max_items):
+    value = request.GET.get(name)
+    if value is None:
+        return None
+    ids = [parse_int(id) for id in value.split(',') if id.strip()]
+    if not ids or len(ids) > max_items:
+        raise ValueError(f"{name} must list 1 to {max_items} ids")
+    return ids
+
+def paginate(queryset, after, limit):
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+    page = list(queryset.order_by('id')[:limit + 1])
+    next_cursor = page[limit - 1].id if len(page) > limit else None
+    return page[:limit], next_cursor
+
+def add_comment_count(article_id, delta):
+    # F() keeps concurrent writers from losing updates; the cached article
+    # and list bodies carry the count, so drop them too.
+    articles = Article.objects.filter(id=article_id)
+    if delta < 0:
+        # A drifted count stays at zero instead of failing the delete.
+        articles = articles.filter(comment_count__gte=-delta)
+    articles.update(comment_count=F('comment_count') + delta, updated_at=timezone.now())
+    invalidate(invalidate_article, article_id)
+    invalidate(bump_version, f"article:{article_id}")
+    invalidate(bump_version, "articles")
+
+def publish_comment_change(article_id, source, obj, op):
+    # Event ids are change feed cursors, so a stream resumes from the database.
+    publish(comment_topic(article_id), (change_cursor(source, obj), serialize_change(obj, op)))
+
+def create_comment(**kwargs):
+    with transaction.atomic():
+        comment = Comment.objects.create(**kwargs)
+        add_comment_count(comment.article_id, 1)
+        publish_comment_change(comment.article_id, COMMENT_SOURCE, comment, "created")
+    return comment
+
+def update_comment(comment):
+    with transaction.atomic():
+        comment.save()
+        publish_comment_change(comment.article_id, COMMENT_SOURCE, comment, "updated")
+
+def delete_comment(comment):
+    id = comment.id
+    with transaction.atomic():
+        # Counted here, where a comment someone else deleted first is not;
+        # the post_delete signal covers cascades.
+        comment.comment_count_handled = True
+        deleted, _ = comment.delete()
+        if deleted:
+            add_comment_count(comment.article_id, -1)
+            tombstone = Tombstone.objects.create(kind=Tombstone.COMMENT, object_id=id, article_id=comment.article_id)
+            publish_comment_change(comment.article_id, TOMBSTONE_SOURCE, tombstone, "deleted")
+
+def delete_article(article):
+    id = article.id
+    with transaction.atomic():
+        # The cascade removes the comments too; the change feed reports them.
+        comment_ids = list(Comment.objects.filter(article=id).values_list('id', flat=True))
+        deleted, _ = article.delete()
+        if deleted:
+            tombstones = Tombstone.objects.bulk_create(
+                [Tombstone(kind=Tombstone.ARTICLE, object_id=id, article_id=id)]
+                + [Tombstone(kind=Tombstone.COMMENT, object_id=comment_id, article_id=id) for comment_id in comment_ids]
+            )
+            for tombstone in tombstones[1:]:
+                publish_comment_change(id, TOMBSTONE_SOURCE, tombstone, "deleted")
+            publish(comment_topic(id), CLOSE)
+
+def serialize_article(article):
+    return {"id": article.id, "title": article.title, "content": article.content, "author": article.author_id,
+            "comment_count": article.comment_count}
+
+def get_include_comments(request):
+    # Returns the per-article comment limit when ?include=comments is set.
+    include = request.GET.get('include')
+    if include is None:
+        return None
+    if include != 'comments':
+        raise ValueError(f"cannot include {include}")
+    limit = get_int_param(request, 'comments_limit', minimum=1) or settings.BLOG_EMBEDDED_COMMENTS_LIMIT
+    return min(limit, settings.BLOG_MAX_PAGE_SIZE)
+
+def with_comments_cutoff(queryset, limit):
+    # Annotates each article with the id of its first comment past the limit
+    # (NULL when it has no more), so the comments query below is one index
+    # range scan per article instead of one query per article.
+    cutoff = Comment.objects.filter(article=OuterRef('pk')).order_by('id').values('id')[limit:limit + 1]
+    return queryset.annotate(comments_cutoff=Subquery(cutoff))
+
+def embedded_comments_querysets(articles, chunk_size=500):
+    # One OR term per article, in chunks: SQLite refuses expression trees
+    # deeper than 1000, and an unpaginated list has up to BLOG_UNPAGINATED_MAX
+    # articles.
+    for start in range(0, len(articles), chunk_size):
+        query = Q()
+        for article in articles[start:start + chunk_size]:
+            if article.comments_cutoff is None:
+                query |= Q(article=article.id)
+            else:
+                query |= Q(article=article.id, id__lt=article.comments_cutoff)
+        yield Comment.objects.filter(query).order_by('article', 'id')
+
+def serialize_with_comments(articles, comments, serialize=serialize_article):
+    embedded = {article.id: [] for article in articles}
+    for comment in comments:
+        embedded[comment.article_id].append(comment)
+    result = []
+    for article in articles:
+        comments = embedded[article.id]
+        next_cursor = comments[-1].id if comments and article.comments_cutoff is not None else None
+        result.append(dict(serialize(article), comments=list(map(serialize_comment, comments)), comments_next=next_cursor))
+    return result
+
+def serialize_articles(articles, comments_limit):
+    if comments_limit is None or not articles:
+        return list(map(serialize_article, articles))
+    return serialize_with_comments(articles, chain.from_iterable(embedded_comments_querysets(articles)))
+
+def serialize_article_detail(article):
+    return {"title": article.title, "content": article.content, "author": article.author_id,
+            "comment_count": article.comment_count}
+
+def serialize_comment(comment):
+    return {"id": comment.id, "article": comment.article_id, "content": comment.content, "author": comment.author_id}
+
+def stream_json_list(queryset, serialize):
+    # Resolve the database now: the body is generated after the view returns.
+    queryset = queryset.using(queryset.db)
+    chunk_size = settings.BLOG_STREAM_CHUNK_SIZE
+    encoder = DjangoJSONEncoder()
+
+    def generate():
+        yield '['
+        separator = ''
+        chunk = []
+        for obj in queryset.iterator(chunk_size=chunk_size):
+            chunk.append(encoder.encode(serialize(obj)))
+            if len(chunk) >= chunk_size:
+                yield separator + ','.join(chunk)
+                separator = ','
+                chunk = []
+        if chunk:
+            yield separator + ','.join(chunk)
+        yield ']'
+
+    return StreamingHttpResponse(generate(), status=200, content_type='application/json')
 
 class ArticleCreateListView(View):
 
     def get(self, request):
         if not check_user_auth(request): return HttpResponse(status=401)
-        articles = Article.objects.all()
-        articles = list(map(lambda x: {"id": x.id, "title": x.title, "content": x.content, "author": x.author.id}, articles))
-        return JsonResponse(articles, status=200, safe=False)
+        try:
+            after = get_int_param(request, 'after')
+            limit = get_int_param(request, 'limit', minimum=1)
+            ids = get_id_list_param(request, 'ids', settings.BLOG_BATCH_MAX_IDS)
+            comments_limit = get_include_comments(request)
+        except ValueError:
+            return HttpResponseBadRequest()
+        stream = get_flag_param(request, 'stream')
+        if stream and comments_limit is not None:
+            return HttpResponseBadRequest()
+        if comments_limit is None:
+            _, etag = make_etag(request, "articles")
+            articles = Article.objects.all()
+        else:
+            _, etag = make_etag(request, "articles", "comments")
+            articles = with_comments_cutoff(Article.objects.all(), comments_limit)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        if ids is not None:
+            found = articles.in_bulk(ids)
+            serialized = {article['id']: article for article in serialize_articles(list(found.values()), comments_limit)}
+            articles = [serialized.get(id, {"id": id, "missing": True}) for id in ids]
+            response = JsonResponse(articles, status=200, safe=False)
+        elif stream:
+            if after is not None:
+                articles = articles.filter(id__gt=after)
+            response = stream_json_list(articles.order_by('id'), serialize_article)
+        elif after is None and limit is None:
+            articles, next_cursor = paginate(articles, None, settings.BLOG_UNPAGINATED_MAX)
+            articles = serialize_articles(articles, comments_limit)
+            response = JsonResponse(articles, status=200, safe=False)
+            if next_cursor is not None:
+                response['X-Next-Cursor'] = next_cursor
+        else:
+            limit = min(limit or settings.BLOG_PAGE_SIZE, settings.BLOG_MAX_PAGE_SIZE)
+            articles, next_cursor = paginate(articles, after, limit)
+            articles = serialize_articles(articles, comments_limit)
+            response = JsonResponse({"results": articles, "next": next_cursor}, status=200)
+        set_etag(response, etag)
+        return response
 
     def post(self, request):
         if not check_user_auth(request): return HttpResponse(status=401)
         author = request.user
         try:
             title, content = get_body_value(request, 'title', 'content')
+        except RequestBodyTooLarge:
+            return HttpResponse(status=413)
         except (KeyError, JSONDecodeError):
             return HttpResponseBadRequest()
-        article = Article.objects.create(title=title, content=content, author=author)
-        return JsonResponse({
-            "id": article.id, 
-            "title": article.title, 
-            "content": article.content, 
-            "author": article.author.id}, status=201)
+        article = run_write(Article.objects.create, title=title, content=content, author=author)
+        return JsonResponse(serialize_article(article), status=201)
+
+
+class ArticleBulkCreateView(View):
+
+    def post(self, request):
+        if not check_user_auth(request): return HttpResponse(status=401)
+        author = request.user
+        build = lambda title, content: Article(title=title, content=content, author=author)
+        return bulk_create_response(request, Article, build, ['title', 'content'],
+                                    lambda objs: invalidate(bump_version, "articles"))
+
+
+
+class ArticleSearchView(View):
+
+    def get(self, request):
+        if not check_user_auth(request): return HttpResponse(status=401)
+        q = request.GET.get('q', '').strip()
+        try:
+            offset = get_int_param(request, 'offset') or 0
+            limit = get_int_param(request, 'limit', minimum=1)
+        except ValueError:
+            return HttpResponseBadRequest()
+        if not q or len(q) > settings.BLOG_SEARCH_MAX_QUERY_LENGTH:
+            return HttpResponseBadRequest()
+        using = Article.objects.all().db
+        if not is_supported(using):
+            return HttpResponse(status=501)
+        limit = min(limit or settings.BLOG_PAGE_SIZE, settings.BLOG_MAX_PAGE_SIZE)
+        hits = search_articles(q, offset, limit + 1, using)
+        next_offset = offset + limit if len(hits) > limit else None
+        hits = hits[:limit]
+        found = Article.objects.using(using).in_bulk([id for id, _ in hits])
+        # A hit can outlive its article between the two queries; skip it.
+        articles = [dict(serialize_article(found[id]), rank=rank) for id, rank in hits if id in found]
+        return JsonResponse({"results": articles, "next": next_offset}, status=200)
 
     
 class ArticleRetUptDelView(View):
         
     def get(self, request, id):
         if not check_user_auth(request): return HttpResponse(status=401)
-        article = get_article(id)
+        try:
+            comments_limit = get_include_comments(request)
+        except ValueError:
+            return HttpResponseBadRequest()
+        if comments_limit is not None:
+            return self.get_with_comments(request, id, comments_limit)
+        _, etag = make_etag(request, f"article:{id}")
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        content = get_cached_article(id)
+        if content is not None:
+            response = HttpResponse(content, status=200, content_type='application/json')
+        else:
+            article = get_article(id)
+            if not article:
+                return HttpResponse(status=404)
+            response = JsonResponse(serialize_article_detail(article), status=200)
+            if reads_from_primary():
+                cache_article(id, response.content)
+        set_etag(response, etag)
+        return response
+
+    def get_with_comments(self, request, id, comments_limit):
+        _, etag = make_etag(request, f"article:{id}", f"comments:{id}")
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        article = with_comments_cutoff(Article.objects.filter(id=id), comments_limit).first()
         if not article:
             return HttpResponse(status=404)
-        return JsonResponse({
-            "title": article.title, 
-            "content": article.content, 
-            "author": article.author.id}, status=200)
+        article = serialize_with_comments([article], chain.from_iterable(embedded_comments_querysets([article])), serialize_article_detail)[0]
+        response = JsonResponse(article, status=200)
+        set_etag(response, etag)
+        return response
 
     def put(self, request, id):
         if not check_user_auth(request): return HttpResponse(status=401)
@@ -84,16 +470,15 @@ class ArticleRetUptDelView(View):
             return HttpResponse(status=403)
         try:
             title, content = get_body_value(request, 'title', 'content')
-        except (KeyError, JSONDecodeError) as e:
+        except RequestBodyTooLarge:
+            return HttpResponse(status=413)
+        except (KeyError, JSONDecodeError):
             return HttpResponseBadRequest()
         article.title = title
         article.content = content
-        article.save()
-        return JsonResponse({
-            "id": article.id, 
-            "title": article.title, 
-            "content": article.content, 
-            "author": article.author.id}, status=200)
+        # Leave comment_count to the F() updates.
+        run_write(article.save, update_fields=['title', 'content', 'updated_at'])
+        return JsonResponse(serialize_article(article), status=200)
         
     def delete(self, request, id):
         if not check_user_auth(request): return HttpResponse(status=401)
@@ -102,7 +487,7 @@ class ArticleRetUptDelView(View):
             return HttpResponse(status=404)
         if not is_author(article, request):
             return HttpResponse(status=403)
-        article.delete()
+        run_write(delete_article, article)
         return HttpResponse(status=200)
 
 
@@ -110,12 +495,46 @@ class CommentCreateListView(View):
 
     def get(self, request, id):
         if not check_user_auth(request): return HttpResponse(status=401)
-        article = get_article(id)
-        if not article:
-            return HttpResponse(status=404)
+        try:
+            after = get_int_param(request, 'after')
+            limit = get_int_param(request, 'limit', minimum=1)
+        except ValueError:
+            return HttpResponseBadRequest()
+        version, etag = make_etag(request, f"comments:{id}")
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        stream = get_flag_param(request, 'stream')
+        paginated = not stream and (after is not None or limit is not None)
+        if not stream and not paginated:
+            content = get_cached_comment_list(id, version)
+            if content is not None:
+                response = HttpResponse(content, status=200, content_type='application/json')
+                set_etag(response, etag)
+                return response
         comments = Comment.objects.filter(article=id)
-        comments = list(map(lambda x: {"id": x.id, "article": x.article.id, "content": x.content, "author": x.author.id}, comments))
-        return JsonResponse(comments, status=200, safe=False)
+        if stream:
+            if not article_exists(id):
+                return HttpResponse(status=404)
+            if after is not None:
+                comments = comments.filter(id__gt=after)
+            response = stream_json_list(comments.order_by('id'), serialize_comment)
+        elif paginated:
+            limit = min(limit or settings.BLOG_PAGE_SIZE, settings.BLOG_MAX_PAGE_SIZE)
+            comments, next_cursor = paginate(comments, after, limit)
+            if not comments and not article_exists(id):
+                return HttpResponse(status=404)
+            comments = list(map(serialize_comment, comments))
+            response = JsonResponse({"results": comments, "next": next_cursor}, status=200)
+        else:
+            comments = list(map(serialize_comment, comments.order_by('id')))
+            # Only an empty list needs the article lookup to tell 404 from [].
+            if not comments and not article_exists(id):
+                return HttpResponse(status=404)
+            response = JsonResponse(comments, status=200, safe=False)
+            if reads_from_primary():
+                cache_comment_list(id, version, response.content)
+        set_etag(response, etag)
+        return response
 
     def post(self, request, id):
         if not check_user_auth(request): return HttpResponse(status=401)
@@ -125,27 +544,49 @@ class CommentCreateListView(View):
         author = request.user
         try:
             content = get_body_value(request, 'content')[0]
-        except (KeyError, JSONDecodeError) as e:
+        except RequestBodyTooLarge:
+            return HttpResponse(status=413)
+        except (KeyError, JSONDecodeError):
             return HttpResponseBadRequest()
-        comment = Comment.objects.create(content=content, article=article, author=author)
-        return JsonResponse({
-            "id": comment.id, 
-            "article": comment.article.id, 
-            "content": comment.content, 
-            "author": comment.author.id}, status=201)
+        comment = run_write(create_comment, content=content, article=article, author=author)
+        return JsonResponse(serialize_comment(comment), status=201)
+
+
+class CommentBulkCreateView(View):
+
+    def post(self, request, id):
+        if not check_user_auth(request): return HttpResponse(status=401)
+        article = get_article(id)
+        if not article:
+            return HttpResponse(status=404)
+        author = request.user
+        build = lambda content: Comment(content=content, article=article, author=author)
+
+        def created(objs):
+            invalidate(invalidate_comment_list, article.id)
+            add_comment_count(article.id, len(objs))
+            for comment in objs:
+                publish_comment_change(article.id, COMMENT_SOURCE, comment, "created")
+
+        return bulk_create_response(request, Comment, build, ['content'], created)
 
     
 class CommentRetUptDelView(View):
 
     def get(self, request, id):
         if not check_user_auth(request): return HttpResponse(status=401)
+        _, etag = make_etag(request, f"comment:{id}")
+        if etag_matches(request, etag):
+            return not_modified(etag)
         comment = get_comment(id)
         if not comment:
             return HttpResponse(status=404)
-        return JsonResponse({
+        response = JsonResponse({
             "content": comment.content,
-            "article": comment.article.id,
-            "author": comment.author.id}, status=200)
+            "article": comment.article_id,
+            "author": comment.author_id}, status=200)
+        set_etag(response, etag)
+        return response
 
     def put(self, request, id):
         if not check_user_auth(request): return HttpResponse(status=401)
@@ -156,15 +597,13 @@ class CommentRetUptDelView(View):
             return HttpResponse(status=403)
         try:
             content = get_body_value(request, 'content')[0]
-        except (KeyError, JSONDecodeError) as e:
+        except RequestBodyTooLarge:
+            return HttpResponse(status=413)
+        except (KeyError, JSONDecodeError):
             return HttpResponseBadRequest()
         comment.content = content
-        comment.save()
-        return JsonResponse({
-            "id": comment.id, 
-            "content": comment.content, 
-            "article": comment.article.id,
-            "author": comment.author.id}, status=200)
+        run_write(update_comment, comment)
+        return JsonResponse(serialize_comment(comment), status=200)
 
     def delete(self, request, id):
         if not check_user_auth(request): return HttpResponse(status=401)
@@ -173,15 +612,51 @@ class CommentRetUptDelView(View):
             return HttpResponse(status=404)
         if not is_author(comment, request):
             return HttpResponse(status=403)
-        comment.delete()
+        run_write(delete_comment, comment)
         return HttpResponse(status=200)
     
 
+def change_op(obj, since):
+    if isinstance(obj, Tombstone):
+        return "deleted"
+    return "created" if since is None or obj.created_at > since[0] else "updated"
+
+def serialize_change(obj, op):
+    if isinstance(obj, Tombstone):
+        return {"type": obj.kind, "op": op, "id": obj.object_id}
+    if isinstance(obj, Article):
+        return {"type": "article", "op": op, "id": obj.id, "data": serialize_article(obj)}
+    return {"type": "comment", "op": op, "id": obj.id, "data": serialize_comment(obj)}
+
+
+class ChangesView(View):
+
+    def get(self, request):
+        if not check_user_auth(request): return HttpResponse(status=401)
+        since = request.GET.get('since')
+        try:
+            cursor = decode_cursor(since) if since else None
+            limit = get_int_param(request, 'limit', minimum=1)
+        except ValueError:
+            return HttpResponseBadRequest()
+        limit = min(limit or settings.BLOG_PAGE_SIZE, settings.BLOG_MAX_PAGE_SIZE)
+        # Leave out the newest rows: a write stamped earlier may still be
+        # committing, and the cursor would skip it.
+        until = timezone.now() - timedelta(seconds=settings.BLOG_CHANGES_SETTLE_SECONDS)
+        rows, more = get_changes(cursor, until, limit)
+        changes = [serialize_change(obj, change_op(obj, cursor)) for timestamp, source, obj in rows]
+        next_cursor = encode_cursor(*rows[-1][:2], rows[-1][2].id) if rows else since
+        return JsonResponse({"changes": changes, "next": next_cursor, "more": more}, status=200)
+
+
 def signup(request):
     if request.method == 'POST':
-        req_data = json.loads(request.body.decode())
-        username = req_data['username']
-        password = req_data['password']
+        try:
+            username, password = get_body_value(request, 'username', 'password')
+        except RequestBodyTooLarge:
+            return HttpResponse(status=413)
+        except (KeyError, JSONDecodeError):
+            return HttpResponseBadRequest()
         User.objects.create_user(username=username, password=password)
         return HttpResponse(status=201)
     else:
@@ -189,9 +664,12 @@ def signup(request):
 
 def signin(request):
     if request.method == 'POST':
-        req_data = json.loads(request.body.decode())
-        username = req_data['username']
-        password = req_data['password']
+        try:
+            username, password = get_body_value(request, 'username', 'password')
+        except RequestBodyTooLarge:
+            return HttpResponse(status=413)
+        except (KeyError, JSONDecodeError):
+            return HttpResponseBadRequest()
         user = authenticate(request, username=username, password=password)
         if user: 
             login(request, user)
@@ -212,6 +690,23 @@ def signout(request):
         return HttpResponseNotAllowed(['GET'])
 
 
+def can_read_metrics(request):
+    try:
+        address = ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        address = None
+    if address and any(address in ip_network(network) for network in settings.BLOG_METRICS_ALLOWED_IPS):
+        return True
+    return request.user.is_staff
+
+def metrics(request):
+    if request.method == 'GET':
+        if not can_read_metrics(request):
+            return HttpResponse(status=403)
+        return HttpResponse(get_metrics().render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    else:
+        return HttpResponseNotAllowed(['GET'])
+
 @ensure_csrf_cookie
 def token(request):
     if request.method == 'GET':
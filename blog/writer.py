@@ -0,0 +1,97 @@
+import queue
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+
+# Runs write callables on one dedicated thread that owns the write connection.
+# Jobs queued while a transaction commits are drained into the next one (group
+# commit); each job gets its own savepoint so a failure only affects its caller.
+class WriteQueue:
+
+    def __init__(self, max_batch):
+        self.max_batch = max_batch
+        self.jobs = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs):
+        future = Future()
+        self.jobs.put((future, func, args, kwargs))
+        self.start()
+        return future
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='blog-writer', daemon=True)
+                self.thread.start()
+
+    def stop(self):
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                self.jobs.put(None)
+                self.thread.join()
+            self.thread = None
+
+    def run(self):
+        try:
+            while True:
+                job = self.jobs.get()
+                if job is None:
+                    return
+                batch = [job]
+                while len(batch) < self.max_batch:
+                    try:
+                        job = self.jobs.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job is None:
+                        self.jobs.put(None)
+                        break
+                    batch.append(job)
+                close_old_connections()
+                self.commit(batch)
+        finally:
+            connection.close()
+
+    def commit(self, batch):
+        results = []
+        try:
+            with transaction.atomic():
+                for future, func, args, kwargs in batch:
+                    try:
+                        with transaction.atomic():
+                            results.append((future, func(*args, **kwargs), None))
+                    except Exception as e:
+                        results.append((future, None, e))
+        except Exception as e:
+            for future, func, args, kwargs in batch:
+                future.set_exception(e)
+            return
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+_write_queue = None
+_write_queue_lock = threading.Lock()
+
+def get_write_queue():
+    global _write_queue
+    with _write_queue_lock:
+        if _write_queue is None:
+            _write_queue = WriteQueue(settings.BLOG_WRITE_QUEUE_MAX_BATCH)
+        return _write_queue
+
+def run_write(func, *args, **kwargs):
+    # Writes already inside a transaction, or issued by the writer itself,
+    # must stay on the calling connection.
+    if (not settings.BLOG_WRITE_QUEUE or connection.in_atomic_block
+            or threading.current_thread().name == 'blog-writer'):
+        return func(*args, **kwargs)
+    return get_write_queue().submit(func, *args, **kwargs).result()
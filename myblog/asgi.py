@@ -9,8 +9,12 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myblog.settings')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+from blog.handlers import BlogASGIHandler  # noqa: E402
+
+application = BlogASGIHandler(urlconf='myblog.async_urls')
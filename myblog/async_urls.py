@@ -0,0 +1,18 @@
+"""myblog URL Configuration serving the async blog views
+
+Same routes as myblog.urls, with the article and comment endpoints handled by
+blog.async_views. myblog.asgi serves it whatever ROOT_URLCONF says, which
+stays 'myblog.urls' for WSGI.
+"""
+from django.contrib import admin
+from django.urls import include, path
+
+from blog import async_views
+from blog.urls import build_urlpatterns
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    # Server-sent events need the async handler, so this route is ASGI only.
+    path('api/article/<id:id>/comment/stream/', async_views.CommentStreamView.as_view(), name='comment_stream'),
+    path('api/', include(build_urlpatterns(async_views))),
+]
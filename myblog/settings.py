@@ -41,15 +41,20 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'blog.middleware.MetricsMiddleware',
+    'blog.middleware.QueryDetectorMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'blog.middleware.ReplicaStickinessMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'blog.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# The WSGI URLconf. myblog.asgi routes to 'myblog.async_urls' instead, which
+# serves the same API from blog.async_views.
 ROOT_URLCONF = 'myblog.urls'
 
 TEMPLATES = [
@@ -70,17 +75,153 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'myblog.wsgi.application'
 
+ASGI_APPLICATION = 'myblog.asgi.application'
+
 
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'blog.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    },
+    # Local stand-in for a read replica; only used once listed in
+    # BLOG_READ_REPLICAS. Point it at the real replica in deployment.
+    'replica': {
+        'ENGINE': 'blog.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.replica.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    },
+}
+
+DATABASE_ROUTERS = ['blog.routers.PrimaryReplicaRouter']
+
+# Blog reads go to a random alias from BLOG_READ_REPLICAS (none: everything
+# uses 'default'). Writes always go to 'default', and a client that wrote
+# reads from 'default' for the next BLOG_REPLICA_STICKY_SECONDS.
+
+BLOG_READ_REPLICAS = []
+
+BLOG_REPLICA_STICKY_SECONDS = 5
+
+# Applied to every new SQLite connection (blog.signals.configure_sqlite).
+# WAL lets readers proceed while a writer holds the lock, and busy_timeout
+# makes writers wait for it instead of failing with "database is locked".
+# The blog.backends.sqlite3 engine begins transactions IMMEDIATE so that
+# busy_timeout also covers transactions that read before they write.
+
+BLOG_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+}
+
+# Route create/update/delete through a single writer thread that commits
+# queued writes together (blog.writer). Up to BLOG_WRITE_QUEUE_MAX_BATCH writes
+# share one transaction.
+
+BLOG_WRITE_QUEUE = False
+
+BLOG_WRITE_QUEUE_MAX_BATCH = 64
+
+
+# Largest JSON request body the blog views will read, in bytes. Bodies
+# declaring a larger Content-Length are rejected with 413 before being read.
+
+BLOG_MAX_BODY_SIZE = 64 * 1024
+
+# POST /api/article/bulk/ and /api/article/<id>/comment/bulk/ take a JSON list
+# of up to BLOG_BULK_MAX_ITEMS items and insert them in one transaction.
+
+BLOG_BULK_MAX_ITEMS = 1000
+
+BLOG_BULK_MAX_BODY_SIZE = 2 * 1024 * 1024
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# Point the 'blog' alias at a shared backend (Redis, Memcached) when running
+# more than one worker process, otherwise invalidations stay process-local.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'blog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'blog',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    'blog_auth': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'blog_auth',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
 }
 
+BLOG_CACHE_ALIAS = 'blog'
+
+BLOG_ARTICLE_CACHE_TIMEOUT = 60
+
+BLOG_COMMENT_LIST_CACHE_TIMEOUT = 60
+
+# ETags and the comment list keys come from version counters in the 'blog'
+# cache that every write bumps. In a process-local (LocMem) cache a write only
+# bumps its own worker's counters, so the others would answer If-None-Match
+# with 304 for stale data; the counters then expire after
+# BLOG_VERSION_TIMEOUT seconds, which bounds that staleness. On a shared
+# backend they never expire.
+
+if CACHES[BLOG_CACHE_ALIAS]['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache':
+    BLOG_VERSION_TIMEOUT = 60
+else:
+    BLOG_VERSION_TIMEOUT = None
+
+
+# Authentication fast path
+# Sessions are read from SESSION_CACHE_ALIAS (written through to the
+# database), and blog.middleware.CachedAuthenticationMiddleware keeps each
+# session's user in BLOG_AUTH_CACHE_ALIAS for BLOG_AUTH_CACHE_TIMEOUT seconds
+# (0 disables it), so authenticated requests usually skip both the
+# django_session and auth_user reads. Swap in
+# 'django.contrib.auth.middleware.AuthenticationMiddleware' and the db session
+# engine to turn the fast path off.
+#
+# A logout only deletes the session from the cache of the process that served
+# it, so with a process-local (LocMem) session cache every other worker would
+# keep accepting the session. Sessions are then read from the database; point
+# SESSION_CACHE_ALIAS at a shared backend (Redis, Memcached) to cache them.
+
+SESSION_CACHE_ALIAS = 'default'
+
+if CACHES[SESSION_CACHE_ALIAS]['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache':
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+BLOG_AUTH_CACHE_ALIAS = 'blog_auth'
+
+# The same goes for the cached users: a password change or deactivation only
+# bumps the user's version counter (in BLOG_CACHE_ALIAS) in the worker that
+# saved it, so the fast path is off unless both caches are shared.
+
+if 'django.core.cache.backends.locmem.LocMemCache' in (CACHES[BLOG_AUTH_CACHE_ALIAS]['BACKEND'],
+                                                      CACHES[BLOG_CACHE_ALIAS]['BACKEND']):
+    BLOG_AUTH_CACHE_TIMEOUT = 0
+else:
+    BLOG_AUTH_CACHE_TIMEOUT = 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -124,3 +265,77 @@ STATIC_URL = '/static/'
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Article list pagination
+# Paginated requests (?after=<id>&limit=<n>) default to BLOG_PAGE_SIZE rows and
+# are clamped to BLOG_MAX_PAGE_SIZE. Requests without either parameter keep the
+# plain list response, capped at BLOG_UNPAGINATED_MAX rows.
+
+BLOG_PAGE_SIZE = 20
+
+BLOG_MAX_PAGE_SIZE = 100
+
+BLOG_UNPAGINATED_MAX = 1000
+
+# ?stream=1 returns the full list as a streamed JSON array, reading and
+# encoding BLOG_STREAM_CHUNK_SIZE rows at a time.
+
+BLOG_STREAM_CHUNK_SIZE = 500
+
+# ?ids=1,2,3 fetches up to BLOG_BATCH_MAX_IDS articles with a single query.
+
+BLOG_BATCH_MAX_IDS = 100
+
+# ?include=comments embeds each article's first comments (BLOG_EMBEDDED_COMMENTS_LIMIT
+# unless ?comments_limit=<n>, clamped to BLOG_MAX_PAGE_SIZE) with one extra query;
+# comments_next is the ?after= cursor for the rest of the comment list.
+
+BLOG_EMBEDDED_COMMENTS_LIMIT = 10
+
+# Article search (GET /api/article/search/?q=) uses the SQLite FTS5 index built
+# by blog migration 0004; results page with ?offset=<n>&limit=<n>.
+
+BLOG_SEARCH_MAX_QUERY_LENGTH = 256
+
+# The change feed (GET /api/changes/?since=<cursor>) pages BLOG_PAGE_SIZE changes
+# at a time and holds back rows newer than BLOG_CHANGES_SETTLE_SECONDS, so a
+# write still committing cannot land behind a cursor already handed out.
+
+BLOG_CHANGES_SETTLE_SECONDS = 1
+
+# Comment event streams (GET /api/article/<id>/comment/stream/, ASGI only). Each
+# connection buffers up to BLOG_EVENT_QUEUE_SIZE events before it is closed for
+# the client to resume with Last-Event-ID; idle streams send a keepalive comment.
+
+BLOG_EVENT_QUEUE_SIZE = 1000
+
+BLOG_EVENT_KEEPALIVE_SECONDS = 15
+
+BLOG_EVENT_RETRY_MS = 3000
+
+# Request metrics (blog.middleware.MetricsMiddleware) per URL name and method,
+# served in the Prometheus text format at /api/metrics/. Only staff users and
+# clients in BLOG_METRICS_ALLOWED_IPS (addresses or networks) may read them;
+# behind a proxy, REMOTE_ADDR is the proxy's address.
+
+BLOG_METRICS = True
+
+BLOG_METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+BLOG_METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+BLOG_METRICS_QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+BLOG_METRICS_SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000)
+
+# Query diagnostics (blog.querydetector). With BLOG_QUERY_DETECTOR on, as in
+# staging, every request logs queries slower than BLOG_SLOW_QUERY_MS and SQL
+# shapes run BLOG_QUERY_REPEAT_THRESHOLD or more times to the 'blog.queries'
+# logger. Tests declare budgets with blog.querydetector.query_budget instead.
+
+BLOG_QUERY_DETECTOR = False
+
+BLOG_SLOW_QUERY_MS = 100
+
+BLOG_QUERY_REPEAT_THRESHOLD = 5